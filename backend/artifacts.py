@@ -0,0 +1,131 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import time
+
+class ArtifactQueueFullError(RuntimeError):
+    pass
+
+def stored_images(directory='original-image'):
+    return sorted(path for path in glob.glob(os.path.join(directory, '*')) if os.path.isfile(path))
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def wait_for_files(paths, timeout, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while True:
+        missing = [path for path in paths if not os.path.exists(path)]
+        if not missing:
+            return
+        if time.monotonic() > deadline:
+            raise FileNotFoundError(f'Artifacts not written after {timeout:g}s: {", ".join(missing)}')
+        time.sleep(interval)
+
+class ArtifactWriter(object):
+
+    def __init__(self, max_pending=256, batch_size=32, batch_wait_ms=5, fsync=True):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.flushed = threading.Condition(self.lock)
+        self.pending = {}
+        self.queue = None
+        self.thread = None
+        self.pid = None
+
+    def _start(self):
+        if self.thread is None or self.pid != os.getpid():
+            self.queue = queue.Queue(self.max_pending)
+            self.pending = {}
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='artifact-writer', daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def submit(self, path, data, timeout=0):
+        with self.lock:
+            self._start()
+            self.pending[path] = data
+            writes = self.queue
+        try:
+            writes.put((path, data), block=timeout > 0, timeout=timeout or None)
+        except queue.Full:
+            with self.lock:
+                if self.pending.get(path) is data:
+                    del self.pending[path]
+            raise ArtifactQueueFullError(f'Artifact queue is full ({self.max_pending} pending writes)')
+
+    def get(self, path):
+        with self.lock:
+            return self.pending.get(path) if self.pid == os.getpid() else None
+
+    def flush(self, timeout=None):
+        with self.lock:
+            if self.pid != os.getpid():
+                return True
+            return self.flushed.wait_for(lambda: not self.pending, timeout)
+
+    def _run(self):
+        writes = self.queue
+        while True:
+            batch = [writes.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(writes.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        files = []
+        for path, data in batch:
+            directory, name = os.path.split(path)
+            tmp_path = os.path.join(directory, f'.{name}.{os.getpid()}.tmp')
+            try:
+                f = open(tmp_path, 'wb')
+            except OSError as e:
+                print(f'failed to write artifact {path}: {e}', flush=True)
+                continue
+            try:
+                f.write(data)
+                f.flush()
+            except OSError as e:
+                print(f'failed to write artifact {path}: {e}', flush=True)
+                f.close()
+                os.remove(tmp_path)
+                continue
+            files.append((path, tmp_path, f))
+        directories = set()
+        for path, tmp_path, f in files:
+            try:
+                if self.fsync:
+                    os.fsync(f.fileno())
+                f.close()
+                os.replace(tmp_path, path)
+                directories.add(os.path.dirname(path) or '.')
+            except OSError as e:
+                print(f'failed to write artifact {path}: {e}', flush=True)
+                f.close()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        if self.fsync:
+            for directory in directories:
+                fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                except OSError:
+                    pass
+                finally:
+                    os.close(fd)
+        with self.lock:
+            for path, data in batch:
+                if self.pending.get(path) is data:
+                    del self.pending[path]
+            self.flushed.notify_all()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+import torch
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+class BatchScheduler(object):
+
+    def __init__(self, run_batch, max_batch_size=4, max_wait_ms=10):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000)
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        self.pid = None
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid() and self.thread.is_alive():
+                return
+            self.queue = Queue()
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+            self.thread.start()
+
+    def submit(self, image_tensor):
+        self._ensure_started()
+        future = Future()
+        self.queue.put((image_tensor, future))
+        return future
+
+    def predict(self, image_tensor, timeout=None):
+        return self.submit(image_tensor).result(timeout=timeout)
+
+    def _collect(self, queue):
+        batch = [queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(queue.get(timeout=remaining))
+                else:
+                    batch.append(queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            batch = self._collect(queue)
+            groups = OrderedDict()
+            for tensor, future in batch:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(tuple(tensor.shape[1:]), []).append((tensor, future))
+            for group in groups.values():
+                self._execute(group)
+
+    def _execute(self, batch):
+        try:
+            inputs = torch.cat([tensor for tensor, _ in batch], dim=0)
+            outputs = self.run_batch(inputs)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for tensor, future in batch:
+            size = tensor.shape[0]
+            future.set_result(outputs[offset:offset + size])
+            offset += size
@@ -0,0 +1,459 @@
+import argparse
+import glob
+import io
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+import numpy as np
+import SimpleITK as sitk
+import cv2
+from scipy import ndimage
+from torchvision import transforms
+from nets.Transforms import Resize, CenterCrop, ApplyCLAHE, ToTensor, InferencePreprocess
+from artifacts import read_file, stored_images
+from lesions import LESION_TYPES, count_lesions
+
+def measure(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def load_images(limit):
+    from pipeline import decode_image
+    return [decode_image(read_file(path)) for path in stored_images()[:limit]]
+
+def legacy_preprocess(image_array):
+    transform_origin = transforms.Compose([
+        Resize(640),
+        CenterCrop(640),
+        ApplyCLAHE(green=False)
+    ])
+    sample_origin = transform_origin({'image': image_array, 'masks': np.zeros((5, 640, 640))})
+    transform = transforms.Compose([
+        Resize(640),
+        CenterCrop(640),
+        ApplyCLAHE(green=False),
+        ToTensor(green=False)
+    ])
+    sample = transform({'image': image_array, 'masks': np.zeros((5, 640, 640))})
+    return sample['image'].unsqueeze(0), sample_origin['image']
+
+def bench_preprocess(args):
+    images = load_images(args.images)
+    preprocess = InferencePreprocess(640)
+    with mock.patch.object(random, 'uniform', lambda low, high: high):
+        for image in images:
+            legacy_tensor, legacy_image = legacy_preprocess(image)
+            tensor, display = preprocess(image)
+            assert np.array_equal(legacy_image, display)
+            assert np.array_equal(legacy_tensor.numpy(), tensor.numpy())
+    legacy = np.mean([measure(lambda: legacy_preprocess(image), args.repeat) for image in images])
+    single_pass = np.mean([measure(lambda: preprocess(image), args.repeat) for image in images])
+    print(f'images: {len(images)}, repeat: {args.repeat}')
+    print(f'legacy load_image:      {legacy:8.2f} ms/request')
+    print(f'InferencePreprocess:    {single_pass:8.2f} ms/request')
+    print(f'saving:                 {legacy - single_pass:8.2f} ms/request ({legacy / single_pass:.2f}x)')
+
+def legacy_count_lesions(pred_mask):
+    lesion_counts = {'EX': 0, 'HE': 0, 'MA': 0, 'SE': 0}
+    for class_idx, lesion_type in LESION_TYPES.items():
+        binary_mask = (pred_mask == class_idx).astype(np.uint8)
+        kernel = np.ones((3, 3), np.uint8)
+        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel)
+        labeled, num_features = ndimage.label(binary_mask)
+        for i in range(1, num_features + 1):
+            area = np.sum(labeled == i)
+            if area >= 10:
+                lesion_counts[lesion_type] += 1
+    return lesion_counts
+
+def synthetic_lesion_mask(num_lesions, size=640, seed=0):
+    rng = np.random.RandomState(seed)
+    pred_mask = np.zeros((size, size), dtype=np.uint8)
+    for _ in range(num_lesions):
+        center = (int(rng.randint(0, size)), int(rng.randint(0, size)))
+        cv2.circle(pred_mask, center, int(rng.randint(1, 7)), int(rng.randint(1, 5)), -1)
+    return pred_mask
+
+def bench_lesions(args):
+    print(f'repeat: {args.repeat}')
+    for num_lesions in (10, 100, 500, 2000):
+        pred_mask = synthetic_lesion_mask(num_lesions)
+        assert legacy_count_lesions(pred_mask) == count_lesions(pred_mask)
+        legacy = measure(lambda: legacy_count_lesions(pred_mask), args.repeat)
+        single_pass = measure(lambda: count_lesions(pred_mask), args.repeat)
+        print(f'{num_lesions:5d} drawn lesions: legacy {legacy:9.2f} ms, analyze_lesions {single_pass:7.2f} ms ({legacy / single_pass:.1f}x)')
+
+def sample_report_data(report_uuid):
+    return {
+        'uuid': report_uuid,
+        'name': '张三',
+        'gender': '男',
+        'age': '56',
+        'occupation': '教师',
+        'contact': '13800000000',
+        'address': '上海市杨浦区',
+        'chief_complaint': '双眼视物模糊三月。',
+        'present_illness': '患者三月前无明显诱因出现双眼视物模糊，无眼痛。',
+        'past_history': '2 型糖尿病史十年。',
+        'ma_count': 12,
+        'he_count': 4,
+        'ex_count': 7,
+        'se_count': 1,
+        'ma_severity': '2',
+        'he_severity': '2',
+        'ex_severity': '1',
+        'se_severity': '1',
+        'clinical_diagnosis': '双眼中度非增殖性糖尿病性视网膜病变。',
+        'treatment_plan': '控制血糖，三月后复查。',
+        'ai_diagnosis': '患者病史概述：略。\n病灶程度评估：略。\n辅助诊断意见：略。'
+    }
+
+def bench_report(args):
+    from report import ReportRenderer
+    paths = sorted(glob.glob('preprocessed-image/*.jpg'))[:args.images]
+    uuids = [os.path.basename(path)[:-4] for path in paths]
+    renderer = ReportRenderer()
+    with tempfile.TemporaryDirectory() as output_dir:
+        def render(report_uuid, template, name):
+            pdf_path = os.path.join(output_dir, f'{report_uuid}-{name}.pdf')
+            template.render(pdf_path, sample_report_data(report_uuid), '2025-01-01 00:00:00')
+            return os.path.getsize(pdf_path)
+        legacy_time = np.mean([measure(lambda: render(u, ReportRenderer(image_dpi=None), 'legacy'), args.repeat) for u in uuids])
+        legacy_size = np.mean([render(u, ReportRenderer(image_dpi=None), 'legacy') for u in uuids])
+        cached_time = np.mean([measure(lambda: render(u, renderer, 'cached'), args.repeat) for u in uuids])
+        cached_size = np.mean([render(u, renderer, 'cached') for u in uuids])
+    print(f'reports: {len(uuids)}, repeat: {args.repeat}')
+    print(f'per-request template, 640px images: {legacy_time:8.2f} ms, {legacy_size / 1024:8.1f} KiB')
+    print(f'cached template, {renderer.image_dpi} dpi images:    {cached_time:8.2f} ms, {cached_size / 1024:8.1f} KiB')
+
+def bench_upload(args):
+    from PIL import Image as PILImage
+    from pipeline import decode_image
+    paths = stored_images()[:args.images]
+    uploads = [read_file(path) for path in paths]
+    with tempfile.TemporaryDirectory() as output_dir:
+        def legacy(data):
+            path = os.path.join(output_dir, 'upload.jpg')
+            img = PILImage.open(io.BytesIO(data))
+            if img.format == 'PNG':
+                background = PILImage.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
+                img = background
+            img.save(path, 'JPEG')
+            return sitk.GetArrayFromImage(sitk.ReadImage(path))
+        for data, path in zip(uploads, paths):
+            decoded = decode_image(data).astype(np.int16)
+            recompressed = legacy(data).astype(np.int16)
+            print(f'{path}: mean |recompressed - decoded| {np.abs(recompressed - decoded).mean():.3f}')
+        legacy_time = np.mean([measure(lambda: legacy(data), args.repeat) for data in uploads])
+    direct_time = np.mean([measure(lambda: decode_image(data), args.repeat) for data in uploads])
+    print(f'uploads: {len(uploads)}, repeat: {args.repeat}')
+    print(f'save + sitk read back:  {legacy_time:8.2f} ms/request')
+    print(f'decode upload bytes:    {direct_time:8.2f} ms/request')
+    print(f'saving:                 {legacy_time - direct_time:8.2f} ms/request ({legacy_time / direct_time:.2f}x)')
+
+def bench_artifacts(args):
+    from artifacts import ArtifactWriter
+    paths = sorted(glob.glob('predicted-image/*.jpg'))[:args.images]
+    payloads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    with tempfile.TemporaryDirectory() as output_dir:
+        def synchronous(index, data):
+            with open(os.path.join(output_dir, f'sync-{index}.jpg'), 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        writer = ArtifactWriter(max_pending=len(payloads) * (args.repeat + 1) + 1)
+        def queued(index, data):
+            writer.submit(os.path.join(output_dir, f'queued-{index}.jpg'), data)
+        sync_time = np.mean([measure(lambda: synchronous(i, data), args.repeat) for i, data in enumerate(payloads)])
+        start = time.perf_counter()
+        queued_time = np.mean([measure(lambda: queued(i, data), args.repeat) for i, data in enumerate(payloads)])
+        writer.flush()
+        drain_time = (time.perf_counter() - start) / (len(payloads) * (args.repeat + 1)) * 1000
+    print(f'artifacts: {len(payloads)}, repeat: {args.repeat}')
+    print(f'synchronous write + fsync: {sync_time:8.2f} ms/artifact on the request path')
+    print(f'ArtifactWriter.submit:     {queued_time:8.2f} ms/artifact on the request path')
+    print(f'ArtifactWriter drain:      {drain_time:8.2f} ms/artifact in the background')
+
+def bench_resolution(args):
+    import torch
+    from inference import INPUT_SIZE, device, load_model, rescale
+    model = load_model(args.model)
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device) for image in load_images(args.images)]
+    def segment(tensor, resolution):
+        with torch.no_grad():
+            output = model.infer(rescale(tensor, resolution).float())
+            return torch.argmax(rescale(output, INPUT_SIZE), dim=1).squeeze(0).cpu().numpy()
+    baselines = [segment(tensor, INPUT_SIZE) for tensor in tensors]
+    baseline_time = np.mean([measure(lambda: segment(tensor, INPUT_SIZE), args.repeat) for tensor in tensors])
+    print(f'images: {len(tensors)}, repeat: {args.repeat}, device: {device}')
+    for resolution in sorted(set(args.resolutions), reverse=True):
+        latency = np.mean([measure(lambda: segment(tensor, resolution), args.repeat) for tensor in tensors])
+        agreement = []
+        count_agreement = []
+        for tensor, baseline in zip(tensors, baselines):
+            pred_mask = segment(tensor, resolution)
+            lesion = (baseline > 0) | (pred_mask > 0)
+            agreement.append(np.mean(baseline[lesion] == pred_mask[lesion]) if lesion.any() else 1.0)
+            count_agreement.append(count_lesions(baseline.astype(np.uint8)) == count_lesions(pred_mask.astype(np.uint8)))
+        print(f'{resolution:4d}px: {latency:8.2f} ms ({baseline_time / latency:.2f}x), '
+              f'lesion pixel agreement {np.mean(agreement) * 100:6.2f}%, '
+              f'identical lesion counts {np.mean(count_agreement) * 100:6.2f}%')
+
+def count_macs(model, run):
+    import torch
+    from torch import nn
+    macs = []
+    def hook(module, inputs, output):
+        kernel = module.weight[0].numel()
+        if isinstance(module, nn.ConvTranspose2d):
+            macs.append(inputs[0].numel() * module.out_channels // module.groups * kernel)
+        else:
+            macs.append(output.numel() * kernel)
+    handles = [module.register_forward_hook(hook) for module in model.modules()
+               if isinstance(module, (nn.Conv2d, nn.ConvTranspose2d, nn.Linear))]
+    try:
+        with torch.no_grad():
+            run()
+    finally:
+        for handle in handles:
+            handle.remove()
+    return sum(macs)
+
+def bench_heads(args):
+    import torch
+    from inference import INPUT_SIZE, device, load_model
+    model = load_model(args.model)
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device).float() for image in load_images(args.images)]
+    def full(tensor):
+        with torch.no_grad():
+            return model(tensor)[-1].permute(0, 3, 1, 2)
+    def head(tensor):
+        with torch.no_grad():
+            return model.infer(tensor, head='out_conv3')
+    for tensor in tensors:
+        assert torch.equal(torch.argmax(full(tensor), dim=1), torch.argmax(head(tensor), dim=1))
+        assert torch.allclose(full(tensor), head(tensor))
+    full_macs = count_macs(model, lambda: full(tensors[0]))
+    head_macs = count_macs(model, lambda: head(tensors[0]))
+    full_time = np.mean([measure(lambda: full(tensor), args.repeat) for tensor in tensors])
+    head_time = np.mean([measure(lambda: head(tensor), args.repeat) for tensor in tensors])
+    print(f'images: {len(tensors)}, repeat: {args.repeat}, device: {device}, masks identical')
+    print(f'forward()[-1]:          {full_time:8.2f} ms, {full_macs * 2 / 1e9:7.1f} GFLOPs')
+    print(f'infer(out_conv3):       {head_time:8.2f} ms, {head_macs * 2 / 1e9:7.1f} GFLOPs')
+    print(f'saving:                 {full_time - head_time:8.2f} ms ({full_time / head_time:.2f}x), '
+          f'{(full_macs - head_macs) * 2 / 1e9:7.1f} GFLOPs ({(1 - head_macs / full_macs) * 100:.1f}%)')
+
+def legacy_postprocess(output, image):
+    import torch
+    from postprocess import LESION_COLORS
+    prob = torch.softmax(torch.softmax(output, dim=1), dim=1)
+    pred_mask = torch.argmax(prob, dim=1).squeeze().cpu().numpy()
+    colored_mask = np.zeros((*pred_mask.shape, 3), dtype=np.uint8)
+    for class_idx, lesion_type in LESION_TYPES.items():
+        colored_mask[pred_mask == class_idx] = LESION_COLORS[lesion_type]
+    overlay = image.copy()
+    mask = (colored_mask != 0).any(axis=2)
+    overlay[mask] = cv2.addWeighted(image[mask], 0.5, colored_mask[mask], 0.5, 0)
+    return pred_mask, overlay
+
+def bench_postprocess(args):
+    import torch
+    from postprocess import OverlayRenderer, class_masks
+    renderer = OverlayRenderer()
+    preprocess = InferencePreprocess(640)
+    images = [preprocess(image)[1] for image in load_images(args.images)]
+    outputs = []
+    for i, image in enumerate(images):
+        output = torch.rand(1, 5, 640, 640, generator=torch.Generator().manual_seed(i))
+        output[:, 0] += torch.from_numpy(synthetic_lesion_mask(500, seed=i) == 0).float()
+        outputs.append(output)
+    def fused(output, image):
+        pred_mask = class_masks(output)[0]
+        return pred_mask, renderer(image[None], pred_mask[None])[0]
+    for output, image in zip(outputs, images):
+        legacy_mask, legacy_overlay = legacy_postprocess(output, image)
+        pred_mask, overlay = fused(output, image)
+        assert np.array_equal(legacy_mask, pred_mask)
+        assert np.array_equal(legacy_overlay, overlay)
+    legacy = np.mean([measure(lambda: legacy_postprocess(o, i), args.repeat) for o, i in zip(outputs, images)])
+    single_pass = np.mean([measure(lambda: fused(o, i), args.repeat) for o, i in zip(outputs, images)])
+    batch_outputs, batch_images = torch.cat(outputs), np.stack(images)
+    batched = measure(lambda: renderer(batch_images, class_masks(batch_outputs)), args.repeat) / len(images)
+    print(f'images: {len(images)}, repeat: {args.repeat}')
+    print(f'legacy post-processing: {legacy:8.2f} ms/image')
+    print(f'fused post-processing:  {single_pass:8.2f} ms/image ({legacy / single_pass:.2f}x)')
+    print(f'fused, batched:         {batched:8.2f} ms/image ({legacy / batched:.2f}x)')
+
+def bench_torchscript(args):
+    import torch
+    from inference import INPUT_SIZE, device, export_torchscript, load_model
+    model = load_model(args.model)
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device).float() for image in load_images(args.images)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        scripted = export_torchscript(model, os.path.join(output_dir, 'model.ts.pt'))
+    def eager(tensor):
+        with torch.no_grad():
+            return model.infer(tensor)
+    def script(tensor):
+        with torch.no_grad():
+            return scripted(tensor)
+    agreement = []
+    for tensor in tensors:
+        agreement.append((torch.argmax(eager(tensor), dim=1) == torch.argmax(script(tensor), dim=1)).float().mean().item())
+    eager_time = np.mean([measure(lambda: eager(tensor), args.repeat) for tensor in tensors])
+    script_time = np.mean([measure(lambda: script(tensor), args.repeat) for tensor in tensors])
+    print(f'images: {len(tensors)}, repeat: {args.repeat}, device: {device}, threads: {torch.get_num_threads()}')
+    print(f'mask agreement:         {np.mean(agreement) * 100:8.4f}% (min {np.min(agreement) * 100:.4f}%)')
+    print(f'eager infer():          {eager_time:8.2f} ms')
+    print(f'frozen TorchScript:     {script_time:8.2f} ms ({eager_time / script_time:.2f}x)')
+
+def bench_backends(args):
+    import torch
+    from inference import INPUT_SIZE, device, export_onnx, export_torchscript, load_model, load_onnx
+    model = load_model(args.model)
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device).float() for image in load_images(args.images)]
+    backends = {'torch': lambda tensor: model.infer(tensor)}
+    with tempfile.TemporaryDirectory() as output_dir:
+        backends['torchscript'] = export_torchscript(model, os.path.join(output_dir, 'model.ts.pt'))
+        try:
+            onnx_path = os.path.join(output_dir, 'model.onnx')
+            export_onnx(model, onnx_path)
+            onnx_model = load_onnx(onnx_path)
+            backends['onnx'] = lambda tensor: onnx_model.infer(tensor)
+        except ImportError:
+            print('onnxruntime is not installed, skipping the onnx backend')
+        with torch.no_grad():
+            baselines = [torch.argmax(model.infer(tensor), dim=1).cpu() for tensor in tensors]
+            batch = torch.cat(tensors[:args.batch_size])
+            print(f'images: {len(tensors)}, repeat: {args.repeat}, batch size: {batch.shape[0]}, threads: {torch.get_num_threads()}')
+            for name, run in backends.items():
+                agreement = np.mean([(torch.argmax(run(tensor).cpu(), dim=1) == baseline).float().mean().item()
+                                     for tensor, baseline in zip(tensors, baselines)])
+                latency = np.mean([measure(lambda: run(tensor), args.repeat) for tensor in tensors])
+                throughput = batch.shape[0] / measure(lambda: run(batch), args.repeat) * 1000
+                print(f'{name:12s} latency {latency:8.2f} ms, throughput {throughput:6.2f} images/s, '
+                      f'mask agreement {agreement * 100:8.4f}%')
+
+def bench_precision(args):
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+    from inference import INPUT_SIZE, autocast, bf16_supported, device, load_model
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device).float() for image in load_images(args.images)]
+    modes = [('fp32', False, False), ('channels_last', True, False), ('channels_last+bf16', True, True)]
+    models = {channels_last: load_model(args.model, channels_last=channels_last) for channels_last in (False, True)}
+    def run(tensor, channels_last, bf16):
+        if channels_last:
+            tensor = tensor.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad(), autocast(bf16):
+            return models[channels_last].infer(tensor).float()
+    def allocated(tensor, channels_last, bf16):
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            run(tensor, channels_last, bf16)
+        return sum(max(event.self_cpu_memory_usage, 0) for event in prof.key_averages())
+    baselines = [torch.argmax(run(tensor, False, False), dim=1) for tensor in tensors]
+    print(f'images: {len(tensors)}, repeat: {args.repeat}, threads: {torch.get_num_threads()}, '
+          f'native bf16: {bf16_supported()}')
+    for name, channels_last, bf16 in modes:
+        latency = np.mean([measure(lambda: run(tensor, channels_last, bf16), args.repeat) for tensor in tensors])
+        memory = allocated(tensors[0], channels_last, bf16)
+        agreement = np.mean([(torch.argmax(run(tensor, channels_last, bf16), dim=1) == baseline).float().mean().item()
+                             for tensor, baseline in zip(tensors, baselines)])
+        print(f'{name:20s} {latency:8.2f} ms, {memory / 1024 ** 2:8.1f} MiB allocated, '
+              f'mask agreement {agreement * 100:8.4f}%')
+
+def bench_switchnorm(args):
+    import torch
+    from nets.Layers import FrozenSwitchNorm2d, SwitchNorm2d
+    from inference import INPUT_SIZE, device, load_model
+    generator = torch.Generator().manual_seed(0)
+    worst = 0.0
+    for using_bn in (True, False):
+        for inplace in (True, False):
+            for trial in range(args.repeat):
+                channels = int(torch.randint(1, 64, (1,), generator=generator))
+                module = SwitchNorm2d(channels, using_bn=using_bn).eval()
+                with torch.no_grad():
+                    module.mean_weight.copy_(torch.randn(module.mean_weight.shape, generator=generator) * 2)
+                    module.var_weight.copy_(torch.randn(module.var_weight.shape, generator=generator) * 2)
+                    module.weight.copy_(torch.randn(module.weight.shape, generator=generator))
+                    module.bias.copy_(torch.randn(module.bias.shape, generator=generator))
+                    if using_bn:
+                        module.running_mean.copy_(torch.randn(module.running_mean.shape, generator=generator))
+                        module.running_var.copy_(torch.rand(module.running_var.shape, generator=generator) * 4 + 0.1)
+                frozen = FrozenSwitchNorm2d.from_switchnorm(module, inplace=inplace).eval()
+                x = torch.randn(2, channels, 17, 23, generator=generator) * 3 + 1
+                with torch.no_grad():
+                    expected = module(x.clone())
+                    actual = frozen(x.clone())
+                difference = (expected - actual).abs().max().item()
+                worst = max(worst, difference)
+                assert torch.allclose(expected, actual, rtol=1e-4, atol=1e-5), \
+                    f'using_bn={using_bn} inplace={inplace} trial={trial}: max |diff| {difference:.3g}'
+            print(f'SwitchNorm2d vs FrozenSwitchNorm2d, using_bn={using_bn!s:5s} inplace={inplace!s:5s}: '
+                  f'{args.repeat} random layers match')
+    print(f'layer max |diff|: {worst:.3g}')
+    reference = load_model(args.model, freeze=False)
+    frozen_model = load_model(args.model, freeze=True)
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    tensors = [preprocess(image)[0].to(device).float() for image in load_images(args.images)]
+    for head in frozen_model.HEADS:
+        differences = []
+        agreement = []
+        for tensor in tensors:
+            with torch.no_grad():
+                expected = reference.infer(tensor, head=head)
+                actual = frozen_model.infer(tensor, head=head)
+            differences.append((expected - actual).abs().max().item())
+            agreement.append((torch.argmax(expected, dim=1) == torch.argmax(actual, dim=1)).float().mean().item())
+            assert torch.allclose(expected, actual, rtol=1e-3, atol=1e-4), \
+                f'{head}: max |diff| {differences[-1]:.3g}'
+        print(f'{head:10s} freeze=False vs freeze=True: max |diff| {max(differences, default=0):.3g}, '
+              f'mask agreement {np.mean(agreement) * 100:8.4f}%')
+    def run(model, tensor):
+        with torch.no_grad():
+            return model.infer(tensor)
+    reference_time = np.mean([measure(lambda: run(reference, tensor), args.repeat) for tensor in tensors])
+    frozen_time = np.mean([measure(lambda: run(frozen_model, tensor), args.repeat) for tensor in tensors])
+    print(f'images: {len(tensors)}, repeat: {args.repeat}, device: {device}')
+    print(f'SwitchNorm2d:           {reference_time:8.2f} ms')
+    print(f'FrozenSwitchNorm2d:     {frozen_time:8.2f} ms ({reference_time / frozen_time:.2f}x)')
+
+BENCHMARKS = {
+    'artifacts': bench_artifacts,
+    'backends': bench_backends,
+    'heads': bench_heads,
+    'lesions': bench_lesions,
+    'report': bench_report,
+    'postprocess': bench_postprocess,
+    'precision': bench_precision,
+    'preprocess': bench_preprocess,
+    'resolution': bench_resolution,
+    'switchnorm': bench_switchnorm,
+    'torchscript': bench_torchscript,
+    'upload': bench_upload
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--model', default='model/model-mcaunet.pth.tar')
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--resolutions', type=int, nargs='+', default=[640, 480, 384, 320])
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
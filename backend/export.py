@@ -0,0 +1,45 @@
+import argparse
+import torch
+from nets.Transforms import InferencePreprocess
+from artifacts import read_file, stored_images
+from inference import INPUT_SIZE, device, export_onnx, export_torchscript, load_model, load_onnx
+from pipeline import decode_image
+
+def parity(model, exported, head, paths):
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    identical = 0
+    for path in paths:
+        tensor = preprocess(decode_image(read_file(path)))[0].to(device).float()
+        with torch.no_grad():
+            eager_mask = torch.argmax(model.infer(tensor, head=head), dim=1)
+            exported_mask = torch.argmax(exported(tensor).to(eager_mask.device), dim=1)
+        agreement = (eager_mask == exported_mask).float().mean().item()
+        identical += agreement == 1.0
+        print(f'{path}: {agreement * 100:.4f}% pixels identical')
+    return identical
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint', default='model/model-mcaunet.pth.tar')
+    parser.add_argument('--format', choices=['torchscript', 'onnx'], default='torchscript')
+    parser.add_argument('--output')
+    parser.add_argument('--head', default='out_conv3')
+    parser.add_argument('--size', type=int, default=INPUT_SIZE)
+    parser.add_argument('--no-optimize', dest='optimize', action='store_false')
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--check-images', type=int, default=4)
+    args = parser.parse_args()
+    model = load_model(args.checkpoint)
+    if args.format == 'onnx':
+        output = args.output or 'model/model-mcaunet.onnx'
+        export_onnx(model, output, head=args.head, size=args.size, opset=args.opset)
+        onnx_model = load_onnx(output)
+        exported = lambda tensor: onnx_model.infer(tensor, head=args.head)
+    else:
+        output = args.output or 'model/model-mcaunet.ts.pt'
+        exported = export_torchscript(model, output, head=args.head, size=args.size, optimize=args.optimize)
+    print(f'wrote {output} (format: {args.format}, head: {args.head}, device: {device})')
+    paths = stored_images()[:args.check_images]
+    if paths:
+        identical = parity(model, exported, args.head, paths)
+        print(f'{identical}/{len(paths)} masks identical to the eager model')
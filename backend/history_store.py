@@ -0,0 +1,196 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+
+HISTORY_FIELDS = ['uuid', 'name', 'gender', 'age', 'occupation', 'contact', 'address', 'time']
+
+SEARCH_FIELDS = ['name', 'contact', 'address', 'occupation']
+
+CJK_PATTERN = re.compile('([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])')
+
+SEARCH_INDEX_VERSION = '3'
+
+class HistoryStore(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            columns = [row['name'] for row in connection.execute('PRAGMA table_info(records)')]
+            if columns and 'id' not in columns:
+                connection.execute('DROP INDEX IF EXISTS records_time')
+                connection.execute('ALTER TABLE records RENAME TO records_old')
+            connection.execute('''CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY,
+                uuid TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                gender TEXT NOT NULL,
+                age TEXT NOT NULL,
+                occupation TEXT NOT NULL,
+                contact TEXT NOT NULL,
+                address TEXT NOT NULL,
+                time TEXT NOT NULL
+            )''')
+            if columns and 'id' not in columns:
+                connection.execute(
+                    f"INSERT INTO records ({', '.join(HISTORY_FIELDS)}) "
+                    f"SELECT {', '.join(HISTORY_FIELDS)} FROM records_old ORDER BY rowid"
+                )
+                connection.execute('DROP TABLE records_old')
+            connection.execute('CREATE INDEX IF NOT EXISTS records_time ON records (time DESC, uuid DESC)')
+            connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            version = connection.execute("SELECT value FROM meta WHERE key = 'search_indexed'").fetchone()
+            if version is None or version['value'] != SEARCH_INDEX_VERSION:
+                connection.execute('DROP TABLE IF EXISTS records_fts')
+            connection.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5({', '.join(SEARCH_FIELDS)})")
+            if version is None or version['value'] != SEARCH_INDEX_VERSION:
+                connection.execute(
+                    f"INSERT INTO records_fts (rowid, {', '.join(SEARCH_FIELDS)}) "
+                    f"SELECT id, {', '.join(f'search_text({field})' for field in SEARCH_FIELDS)} FROM records"
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('search_indexed', ?)",
+                    [SEARCH_INDEX_VERSION]
+                )
+
+    def _connect(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.create_function('search_text', 1, search_text)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def _index(self, connection, record):
+        record_id = connection.execute('SELECT id FROM records WHERE uuid = ?', [str(record['uuid'])]).fetchone()[0]
+        connection.execute('DELETE FROM records_fts WHERE rowid = ?', [record_id])
+        connection.execute(
+            f"INSERT INTO records_fts (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (?, {', '.join('?' * len(SEARCH_FIELDS))})",
+            [record_id] + [search_text(record[field]) for field in SEARCH_FIELDS]
+        )
+
+    def _insert(self, connection, record, replace=True):
+        if replace:
+            conflict = 'DO UPDATE SET ' + ', '.join(f'{field} = excluded.{field}' for field in HISTORY_FIELDS[1:])
+        else:
+            conflict = 'DO NOTHING'
+        cursor = connection.execute(
+            f"INSERT INTO records ({', '.join(HISTORY_FIELDS)}) VALUES ({', '.join('?' * len(HISTORY_FIELDS))}) "
+            f"ON CONFLICT (uuid) {conflict}",
+            [str(record[field]) for field in HISTORY_FIELDS]
+        )
+        if cursor.rowcount:
+            self._index(connection, record)
+
+    def add(self, record):
+        with self._connect() as connection:
+            self._insert(connection, record)
+
+    def list(self, limit=None, cursor=None):
+        query = f"SELECT {', '.join(HISTORY_FIELDS)} FROM records"
+        params = []
+        if cursor:
+            time, record_uuid = decode_cursor(cursor)
+            query += ' WHERE (time, uuid) < (?, ?)'
+            params.extend([time, record_uuid])
+        query += ' ORDER BY time DESC, uuid DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit + 1)
+        rows = [dict(row) for row in self._connect().execute(query, params)]
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['time'], rows[-1]['uuid'])
+        return rows, next_cursor
+
+    def search(self, query=None, fields=None, start_time=None, end_time=None, limit=20, offset=0):
+        match = match_expression(query, fields or {})
+        conditions = []
+        params = []
+        if match:
+            select = f"SELECT {', '.join('r.' + field for field in HISTORY_FIELDS)} FROM records_fts JOIN records r ON r.id = records_fts.rowid"
+            conditions.append('records_fts MATCH ?')
+            params.append(match)
+            order = 'bm25(records_fts), r.time DESC'
+        else:
+            select = f"SELECT {', '.join('r.' + field for field in HISTORY_FIELDS)} FROM records r"
+            order = 'r.time DESC, r.uuid DESC'
+        if start_time:
+            conditions.append('r.time >= ?')
+            params.append(start_time)
+        if end_time:
+            conditions.append('r.time <= ?')
+            params.append(end_time)
+        query = select
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY {order} LIMIT ? OFFSET ?'
+        params.extend([limit + 1, offset])
+        rows = [dict(row) for row in self._connect().execute(query, params)]
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+    def migrate_directory(self, directory):
+        connection = self._connect()
+        if connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_directory'").fetchone():
+            return 0
+        imported = 0
+        with connection:
+            for filename in os.listdir(directory):
+                if not filename.endswith('.txt'):
+                    continue
+                with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                    lines = [line.strip() for line in f.readlines()]
+                if len(lines) < 7:
+                    continue
+                record = dict(zip(HISTORY_FIELDS, [filename[:-4]] + lines[:7]))
+                self._insert(connection, record, replace=False)
+                imported += 1
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_directory', ?)",
+                [directory]
+            )
+        return imported
+
+def search_tokens(text):
+    return CJK_PATTERN.sub(' \\1 ', str(text)).split()
+
+def search_text(text):
+    return ' '.join(search_tokens(text))
+
+def match_phrase(text):
+    tokens = search_tokens(text)
+    if not tokens:
+        return None
+    return '"' + ' '.join(tokens).replace('"', '""') + '"*'
+
+def match_expression(query, fields):
+    terms = []
+    for word in (query or '').split():
+        phrase = match_phrase(word)
+        if phrase:
+            terms.append(phrase)
+    for field, value in fields.items():
+        if field not in SEARCH_FIELDS:
+            continue
+        for word in (value or '').split():
+            phrase = match_phrase(word)
+            if phrase:
+                terms.append(f'{field} : {phrase}')
+    return ' AND '.join(terms)
+
+def encode_cursor(time, record_uuid):
+    return base64.urlsafe_b64encode(json.dumps([time, record_uuid]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    time, record_uuid = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    return time, record_uuid
@@ -0,0 +1,185 @@
+import contextlib
+import json
+import os
+import threading
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch import nn
+from collections import OrderedDict
+from nets.CAUNet import CAUNet
+from nets.Layers import freeze_switchnorm
+
+device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+INPUT_SIZE = 640
+MIN_RESOLUTION = 160
+
+INFERENCE_BACKENDS = ['torch', 'torchscript', 'onnx', 'int8']
+
+QUANTIZED_ENGINE = 'fbgemm'
+
+def load_state_dict(checkpoint_path):
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    state_dict = OrderedDict()
+    for k, v in checkpoint['state_dict'].items():
+        name = k[7:] if k.startswith('module.') else k
+        state_dict[name] = v
+    return state_dict
+
+def load_model(checkpoint_path, freeze=True, channels_last=False):
+    model = CAUNet(3, 5)
+    model.load_state_dict(load_state_dict(checkpoint_path))
+    model.eval()
+    if freeze:
+        freeze_switchnorm(model)
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+    model = model.to(device)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+def bf16_supported():
+    if device.type != 'cpu':
+        return False
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+def autocast(bf16):
+    if bf16:
+        return torch.autocast('cpu', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+class InferenceHead(nn.Module):
+
+    def __init__(self, model, head='out_conv3'):
+        super(InferenceHead, self).__init__()
+        self.model = model
+        self.head = head
+
+    def forward(self, x):
+        return self.model.infer(x, head=self.head)
+
+class ScriptedModel(object):
+
+    def __init__(self, module, head, device=device):
+        self.module = module
+        self.device = device
+        self.HEADS = (head,)
+
+    def infer(self, x, head='out_conv3'):
+        if head not in self.HEADS:
+            raise ValueError(f'TorchScript model was exported for head {self.HEADS[0]}, not {head}')
+        return self.module(x.to(self.device))
+
+def save_torchscript(module, output_path, head='out_conv3', size=INPUT_SIZE, optimize=True, example_device=device):
+    example = torch.zeros(1, 3, size, size, device=example_device)
+    with torch.no_grad():
+        traced = torch.jit.trace(module.eval(), example, check_trace=False)
+    frozen = torch.jit.freeze(traced)
+    if optimize:
+        frozen = torch.jit.optimize_for_inference(frozen)
+    metadata = json.dumps({'head': head, 'input_size': size})
+    torch.jit.save(frozen, output_path, _extra_files={'metadata.json': metadata})
+    return frozen
+
+def export_torchscript(model, output_path, head='out_conv3', size=INPUT_SIZE, optimize=True):
+    example_device = next(model.parameters()).device
+    return save_torchscript(InferenceHead(model, head), output_path, head, size, optimize, example_device)
+
+def load_torchscript(script_path, map_location=device):
+    extra_files = {'metadata.json': ''}
+    module = torch.jit.load(script_path, map_location=map_location, _extra_files=extra_files)
+    metadata = json.loads(extra_files['metadata.json'] or '{}')
+    return ScriptedModel(module.eval(), metadata.get('head', 'out_conv3'), torch.device(map_location))
+
+def load_int8(script_path):
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    return load_torchscript(script_path, map_location='cpu')
+
+class OnnxModel(object):
+
+    def __init__(self, onnx_path, threads=None):
+        import onnxruntime
+        self.onnx_path = onnx_path
+        self.threads = threads
+        self.pid = None
+        self.session = None
+        self.lock = threading.Lock()
+        outputs = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_outputs()
+        self.HEADS = (outputs[0].name,)
+
+    def _session(self):
+        with self.lock:
+            if self.session is None or self.pid != os.getpid():
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+                options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+                options.inter_op_num_threads = 1
+                if self.threads:
+                    options.intra_op_num_threads = self.threads
+                self.session = onnxruntime.InferenceSession(self.onnx_path, options, providers=['CPUExecutionProvider'])
+                self.input_name = self.session.get_inputs()[0].name
+                self.pid = os.getpid()
+            return self.session
+
+    def infer(self, x, head='out_conv3'):
+        if head not in self.HEADS:
+            raise ValueError(f'ONNX model was exported for head {self.HEADS[0]}, not {head}')
+        session = self._session()
+        image = np.ascontiguousarray(x.detach().float().cpu().numpy())
+        return torch.from_numpy(session.run(None, {self.input_name: image})[0])
+
+def export_onnx(model, output_path, head='out_conv3', size=INPUT_SIZE, opset=13):
+    example = torch.zeros(1, 3, size, size, device=next(model.parameters()).device)
+    axes = {0: 'batch', 2: 'height', 3: 'width'}
+    with torch.no_grad():
+        torch.onnx.export(
+            InferenceHead(model, head).eval(),
+            example,
+            output_path,
+            input_names=['image'],
+            output_names=[head],
+            dynamic_axes={'image': axes, head: axes},
+            opset_version=opset,
+            do_constant_folding=True
+        )
+
+def load_onnx(onnx_path, threads=None):
+    return OnnxModel(onnx_path, threads)
+
+def load_backend(backend, checkpoint_path, script_path=None, onnx_path=None, int8_path=None, onnx_threads=None,
+                 freeze=True, channels_last=False):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f'Invalid INFERENCE_BACKEND: {backend}')
+    if backend == 'onnx':
+        return load_onnx(onnx_path, onnx_threads)
+    if backend == 'int8':
+        return load_int8(int8_path)
+    if backend == 'torchscript':
+        return load_torchscript(script_path)
+    if channels_last and not freeze:
+        raise ValueError('MODEL_CHANNELS_LAST requires MODEL_FREEZE_SWITCHNORM')
+    return load_model(checkpoint_path, freeze=freeze, channels_last=channels_last)
+
+def predict(model, image_tensor, head='out_conv3', channels_last=False, bf16=False):
+    image_tensor = image_tensor.float()
+    if channels_last:
+        image_tensor = image_tensor.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad(), autocast(bf16):
+        return model.infer(image_tensor, head=head).float()
+
+def valid_resolution(resolution):
+    return MIN_RESOLUTION <= resolution <= INPUT_SIZE and resolution % 16 == 0
+
+def rescale(tensor, size):
+    if tensor.shape[-1] == size and tensor.shape[-2] == size:
+        return tensor
+    return F.interpolate(tensor.float(), size=(size, size), mode='bilinear', align_corners=False,
+                         antialias=size < tensor.shape[-1])
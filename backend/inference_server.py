@@ -0,0 +1,168 @@
+import itertools
+import os
+import signal
+import threading
+import time
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+import torch
+
+def server_addresses(base, processes):
+    return [f'{base}.{index}' for index in range(max(1, processes))]
+
+def parse_core_sets(spec, processes):
+    if spec:
+        core_sets = []
+        for group in spec.split(';'):
+            cores = set()
+            for part in group.split(','):
+                part = part.strip()
+                if not part:
+                    continue
+                if '-' in part:
+                    start, end = part.split('-')
+                    cores.update(range(int(start), int(end) + 1))
+                else:
+                    cores.add(int(part))
+            core_sets.append(sorted(cores))
+        if len(core_sets) != processes:
+            raise ValueError(f'INFERENCE_CORES lists {len(core_sets)} core sets for {processes} inference processes')
+        return core_sets
+    if not hasattr(os, 'sched_getaffinity'):
+        return [None] * processes
+    available = sorted(os.sched_getaffinity(0))
+    share = max(1, len(available) // processes)
+    return [available[index * share:(index + 1) * share] or available for index in range(processes)]
+
+class InferenceClient(object):
+
+    def __init__(self, addresses, authkey=None, timeout=120, connect_timeout=60):
+        self.addresses = addresses
+        self.authkey = authkey.encode('utf-8') if isinstance(authkey, str) else authkey
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.counter = itertools.count()
+        self.local = threading.local()
+
+    def _connect(self):
+        address = self.addresses[next(self.counter) % len(self.addresses)]
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(address, family='AF_UNIX', authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = self._connect()
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return connection
+
+    def _discard(self):
+        connection = getattr(self.local, 'connection', None)
+        self.local.connection = None
+        if connection is not None:
+            connection.close()
+
+    def predict(self, image_tensor, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        connection = self._connection()
+        try:
+            connection.send(image_tensor.detach().cpu().numpy())
+            if not connection.poll(timeout):
+                raise TimeoutError('Inference server did not answer in time')
+            status, payload = connection.recv()
+        except (EOFError, OSError, TimeoutError):
+            self._discard()
+            raise
+        if status != 'ok':
+            raise RuntimeError(payload)
+        return torch.from_numpy(payload)
+
+def handle_connection(connection, scheduler):
+    with connection:
+        while True:
+            try:
+                image = connection.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                output = scheduler.predict(torch.from_numpy(image))
+                reply = ('ok', output.cpu().numpy())
+            except Exception as e:
+                reply = ('error', f'{type(e).__name__}: {e}')
+            try:
+                connection.send(reply)
+            except (EOFError, OSError):
+                return
+
+def serve(index, address, cores, threads, authkey):
+    from dotenv import load_dotenv
+    from batching import BatchScheduler
+    from inference import bf16_supported, load_backend, predict
+    load_dotenv()
+    if cores is not None:
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    backend = os.getenv('INFERENCE_BACKEND', 'torchscript' if os.getenv('MODEL_SCRIPT_PATH') else 'torch')
+    head = os.getenv('INFERENCE_HEAD', 'out_conv3')
+    channels_last = backend == 'torch' and os.getenv('MODEL_CHANNELS_LAST', '0') == '1'
+    bf16 = backend == 'torch' and os.getenv('MODEL_BF16', '0') == '1' and bf16_supported()
+    model = load_backend(
+        backend,
+        os.getenv('MODEL_PATH', 'model/model-mcaunet.pth.tar'),
+        script_path=os.getenv('MODEL_SCRIPT_PATH', 'model/model-mcaunet.ts.pt'),
+        onnx_path=os.getenv('MODEL_ONNX_PATH', 'model/model-mcaunet.onnx'),
+        int8_path=os.getenv('MODEL_INT8_PATH', 'model/model-mcaunet.int8.ts.pt'),
+        onnx_threads=threads if backend == 'onnx' else None,
+        freeze=os.getenv('MODEL_FREEZE_SWITCHNORM', '1') == '1',
+        channels_last=channels_last
+    )
+    if head not in model.HEADS:
+        raise ValueError(f'Invalid INFERENCE_HEAD: {head}')
+    scheduler = BatchScheduler(
+        lambda batch: predict(model, batch, head, channels_last, bf16),
+        int(os.getenv('BATCH_MAX_SIZE', '4')),
+        float(os.getenv('BATCH_MAX_WAIT_MS', '10'))
+    )
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family='AF_UNIX', authkey=authkey)
+    core_list = ','.join(str(core) for core in cores) if cores is not None else 'all'
+    print(f'inference process {index}: pid {os.getpid()}, socket {address}, cores {core_list}, '
+          f'torch threads {torch.get_num_threads()}, interop threads {torch.get_num_interop_threads()}, '
+          f'backend {backend}, head {head}, channels_last {channels_last}, bf16 {bf16}', flush=True)
+    while True:
+        connection = listener.accept()
+        threading.Thread(target=handle_connection, args=(connection, scheduler), daemon=True).start()
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    load_dotenv()
+    base = os.getenv('INFERENCE_SERVER', '/tmp/diabretina-inference.sock')
+    processes = max(1, int(os.getenv('INFERENCE_PROCESSES', '1')))
+    authkey = os.getenv('INFERENCE_AUTHKEY')
+    authkey = authkey.encode('utf-8') if authkey else None
+    core_sets = parse_core_sets(os.getenv('INFERENCE_CORES'), processes)
+    thread_budget = int(os.getenv('INFERENCE_THREADS', '0'))
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    for index, (address, cores) in enumerate(zip(server_addresses(base, processes), core_sets)):
+        threads = thread_budget or (len(cores) if cores else torch.get_num_threads())
+        print(f'starting inference process {index}: socket {address}, cores {cores or "all"}, threads {threads}', flush=True)
+        worker = context.Process(target=serve, args=(index, address, cores, threads, authkey), name=f'inference-{index}')
+        worker.start()
+        workers.append(worker)
+    def shutdown(signum, frame):
+        for worker in workers:
+            worker.terminate()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for worker in workers:
+        worker.join()
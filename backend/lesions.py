@@ -0,0 +1,47 @@
+import cv2
+import numpy as np
+
+LESION_TYPES = {
+    1: 'EX',
+    2: 'HE',
+    3: 'MA',
+    4: 'SE'
+}
+
+MIN_LESION_AREA = 10
+
+OPEN_KERNEL = np.ones((3, 3), np.uint8)
+
+def analyze_lesions(pred_mask, min_area=MIN_LESION_AREA):
+    lesion_counts = {}
+    lesions = {}
+    for class_idx, lesion_type in LESION_TYPES.items():
+        binary_mask = (pred_mask == class_idx).astype(np.uint8)
+        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, OPEN_KERNEL)
+        _, _, stats, centroids = cv2.connectedComponentsWithStats(binary_mask, connectivity=4)
+        components = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] >= min_area) + 1
+        lesions[lesion_type] = [{
+            'area': int(stats[i, cv2.CC_STAT_AREA]),
+            'bbox': [
+                int(stats[i, cv2.CC_STAT_LEFT]),
+                int(stats[i, cv2.CC_STAT_TOP]),
+                int(stats[i, cv2.CC_STAT_WIDTH]),
+                int(stats[i, cv2.CC_STAT_HEIGHT])
+            ],
+            'centroid': [round(float(centroids[i, 0]), 2), round(float(centroids[i, 1]), 2)]
+        } for i in components]
+        lesion_counts[lesion_type] = len(components)
+    return lesion_counts, lesions
+
+def count_lesions(pred_mask, min_area=MIN_LESION_AREA):
+    return analyze_lesions(pred_mask, min_area)[0]
+
+def get_severity_text(severity_code):
+    severity_map = {
+        '0': '健康',
+        '1': '轻度非增殖性 DR（Mild-NPDR）',
+        '2': '中度非增殖性 DR（Moderate-NPDR）',
+        '3': '重度非增殖性 DR（Severe-NPDR）',
+        '4': '增殖性 DR（PDR）'
+    }
+    return severity_map.get(severity_code, '未知')
@@ -0,0 +1,96 @@
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class LLMGatewayBusyError(RuntimeError):
+    pass
+
+LLM_ERRORS = (requests.RequestException, LLMGatewayBusyError, KeyError, IndexError, ValueError)
+
+class LLMSlot(object):
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.lock = threading.Lock()
+        self.released = False
+
+    def release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.semaphore.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class LLMGateway(object):
+
+    def __init__(self, api_url, api_key, model, max_concurrency=2, acquire_timeout=0.5,
+                 connect_timeout=5, read_timeout=120, max_retries=2, backoff_factor=0.5):
+        self.api_url = api_url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        })
+
+    def reserve(self):
+        if not self.semaphore.acquire(timeout=self.acquire_timeout):
+            raise LLMGatewayBusyError('Too many concurrent LLM requests')
+        return LLMSlot(self.semaphore)
+
+    def _payload(self, messages, stream=False):
+        payload = {
+            'model': self.model,
+            'messages': messages
+        }
+        if stream:
+            payload['stream'] = True
+        return payload
+
+    def complete(self, messages):
+        with self.reserve():
+            response = self.session.post(self.api_url, json=self._payload(messages), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['choices'][0]['message']['content']
+
+    def stream(self, messages, slot=None):
+        with slot or self.reserve():
+            with self.session.post(self.api_url, json=self._payload(messages, stream=True),
+                                   timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line.startswith(b'data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == b'[DONE]':
+                        break
+                    choices = json.loads(data).get('choices') or []
+                    if not choices:
+                        continue
+                    content = (choices[0].get('delta') or {}).get('content')
+                    if content:
+                        yield content
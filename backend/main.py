@@ -1,44 +1,83 @@
+import time
+STARTUP_STARTED = time.perf_counter()
 import os
 import uuid
-import requests
 import io
+import json
 import base64
-import numpy as np
-import torch
-import SimpleITK as sitk
-import cv2
+import threading
 from datetime import datetime, timedelta
 from PIL import Image as PILImage
-from torchvision import transforms
-from collections import OrderedDict
-from nets.Transforms import Resize, CenterCrop, ApplyCLAHE, ToTensor
-from nets.CAUNet import CAUNet
-from flask import Flask, request, jsonify, send_file
+from artifacts import ArtifactQueueFullError, ArtifactWriter, wait_for_files
+from cache import DiskCache, ResultCache, content_hash
+from report_jobs import REPORT_BASE_URL, ReportJobQueue
+from history_store import HistoryStore, SEARCH_FIELDS
+from startup import BackgroundLoader, NotReadyError, StartupTimer
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
-from scipy import ndimage
 from dotenv import load_dotenv
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.graphics.shapes import Drawing, Rect
+
+startup_timer = StartupTimer('app', STARTUP_STARTED)
+startup_timer.mark('imports')
 
 load_dotenv()
 
 VOLCENGINE_API_URL = os.getenv('VOLCENGINE_API_URL')
 VOLCENGINE_API_KEY = os.getenv('VOLCENGINE_API_KEY')
+VOLCENGINE_MODEL = os.getenv('VOLCENGINE_MODEL', 'doubao-1-5-pro-32k-250115')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '2'))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv('LLM_ACQUIRE_TIMEOUT', '0.5'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '120'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '4'))
+BATCH_MAX_WAIT_MS = float(os.getenv('BATCH_MAX_WAIT_MS', '10'))
+MODEL_PATH = os.getenv('MODEL_PATH', 'model/model-mcaunet.pth.tar')
+MODEL_FREEZE_SWITCHNORM = os.getenv('MODEL_FREEZE_SWITCHNORM', '1') == '1'
+MODEL_SCRIPT_PATH = os.getenv('MODEL_SCRIPT_PATH', 'model/model-mcaunet.ts.pt')
+MODEL_ONNX_PATH = os.getenv('MODEL_ONNX_PATH', 'model/model-mcaunet.onnx')
+MODEL_INT8_PATH = os.getenv('MODEL_INT8_PATH', 'model/model-mcaunet.int8.ts.pt')
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'torchscript' if os.getenv('MODEL_SCRIPT_PATH') else 'torch')
+MODEL_CHANNELS_LAST = INFERENCE_BACKEND == 'torch' and os.getenv('MODEL_CHANNELS_LAST', '0') == '1'
+MODEL_BF16 = INFERENCE_BACKEND == 'torch' and os.getenv('MODEL_BF16', '0') == '1'
+MODEL_READY_TIMEOUT = float(os.getenv('MODEL_READY_TIMEOUT', '30'))
+INFERENCE_HEAD = os.getenv('INFERENCE_HEAD', 'out_conv3')
+INFERENCE_SERVER = os.getenv('INFERENCE_SERVER')
+INFERENCE_PROCESSES = int(os.getenv('INFERENCE_PROCESSES', '1'))
+INFERENCE_AUTHKEY = os.getenv('INFERENCE_AUTHKEY')
+INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT', '120'))
+WORKER_TORCH_THREADS = int(os.getenv('WORKER_TORCH_THREADS', '1'))
+MODEL_PRELOAD = not INFERENCE_SERVER and os.getenv('MODEL_PRELOAD', '1') == '1'
+TRIAGE_RESOLUTION = int(os.getenv('TRIAGE_RESOLUTION', '384'))
+TILED_INFERENCE = os.getenv('TILED_INFERENCE', '0') == '1'
+TILE_SIZE = int(os.getenv('TILE_SIZE', '640'))
+TILE_OVERLAP = int(os.getenv('TILE_OVERLAP', '128'))
+TILE_BATCH_SIZE = int(os.getenv('TILE_BATCH_SIZE', '4'))
+REPORT_IMAGE_DPI = int(os.getenv('REPORT_IMAGE_DPI', '150'))
+HISTORY_DB_PATH = os.getenv('HISTORY_DB_PATH', 'diagnosis-history.db')
+HISTORY_MAX_LIMIT = int(os.getenv('HISTORY_MAX_LIMIT', '500'))
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+REPORT_JOB_TIMEOUT = float(os.getenv('REPORT_JOB_TIMEOUT', '300'))
+REPORT_QUEUE_TIMEOUT = float(os.getenv('REPORT_QUEUE_TIMEOUT', '3600'))
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'result-cache')
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv('RESULT_CACHE_MEMORY_ITEMS', '32'))
+DIAGNOSIS_CACHE_DIR = os.getenv('DIAGNOSIS_CACHE_DIR', 'diagnosis-cache')
+DIAGNOSIS_CACHE_MAX_BYTES = int(os.getenv('DIAGNOSIS_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+DIAGNOSIS_CACHE_MEMORY_ITEMS = int(os.getenv('DIAGNOSIS_CACHE_MEMORY_ITEMS', '256'))
+DIAGNOSIS_CACHE_TTL = float(os.getenv('DIAGNOSIS_CACHE_TTL', str(7 * 24 * 3600)))
+ARTIFACT_QUEUE_SIZE = int(os.getenv('ARTIFACT_QUEUE_SIZE', '256'))
+ARTIFACT_QUEUE_TIMEOUT = float(os.getenv('ARTIFACT_QUEUE_TIMEOUT', '1'))
+ARTIFACT_BATCH_SIZE = int(os.getenv('ARTIFACT_BATCH_SIZE', '32'))
+ARTIFACT_BATCH_WAIT_MS = float(os.getenv('ARTIFACT_BATCH_WAIT_MS', '5'))
+ARTIFACT_FSYNC = os.getenv('ARTIFACT_FSYNC', '1') == '1'
+ARTIFACT_WAIT_TIMEOUT = float(os.getenv('ARTIFACT_WAIT_TIMEOUT', '30'))
+ARTIFACT_READ_TIMEOUT = float(os.getenv('ARTIFACT_READ_TIMEOUT', '1'))
 
 if not VOLCENGINE_API_URL or not VOLCENGINE_API_KEY:
     raise ValueError('Missing required environment variables: VOLCENGINE_API_URL or VOLCENGINE_API_KEY')
 
-pdfmetrics.registerFont(
-    TTFont('wqy-zenhei', '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc')
-)
-
 app = Flask(__name__)
 CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = None
@@ -48,134 +87,166 @@ os.makedirs('diagnostic-report', exist_ok=True)
 os.makedirs('original-image', exist_ok=True)
 os.makedirs('predicted-image', exist_ok=True)
 os.makedirs('preprocessed-image', exist_ok=True)
+startup_timer.mark('config')
 
-LESION_COLORS = {
-    'EX': (255, 0, 96),
-    'MA': (0, 223, 162),
-    'HE': (0, 121, 255),
-    'SE': (246, 250, 112)
+MODEL_ARTIFACTS = {
+    'torch': MODEL_PATH,
+    'torchscript': MODEL_SCRIPT_PATH,
+    'onnx': MODEL_ONNX_PATH,
+    'int8': MODEL_INT8_PATH
 }
 
-LESION_TYPES = {
-    1: 'EX',
-    2: 'HE',
-    3: 'MA',
-    4: 'SE'
-}
+def model_identity(backend):
+    path = MODEL_ARTIFACTS.get(backend, MODEL_PATH)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return f'{backend}:{path}'
+    return f'{backend}:{path}:{stat.st_mtime_ns}:{stat.st_size}'
+
+MODEL_IDENTITY = model_identity(INFERENCE_BACKEND)
 
-model = CAUNet(3, 5)
-checkpoint = torch.load('model/model-mcaunet.pth.tar', map_location='cpu')
-new_state_dict = OrderedDict()
-for k, v in checkpoint['state_dict'].items():
-    name = k[7:] if k.startswith('module.') else k
-    new_state_dict[name] = v
-model.load_state_dict(new_state_dict)
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-model = model.to(device)
-
-def load_image(image_path):
-    image = sitk.ReadImage(image_path)
-    image_array = sitk.GetArrayFromImage(image)
-    transform_origin = transforms.Compose([
-        Resize(640),
-        CenterCrop(640),
-        ApplyCLAHE(green=False)
-    ])
-    sample_origin = {'image': image_array, 'masks': np.zeros((5, 640, 640))}
-    sample_origin = transform_origin(sample_origin)
-    transform = transforms.Compose([
-        Resize(640),
-        CenterCrop(640),
-        ApplyCLAHE(green=False),
-        ToTensor(green=False)
-    ])
-    sample = {'image': image_array, 'masks': np.zeros((5, 640, 640))}
-    sample = transform(sample)
-    return sample['image'].unsqueeze(0), sample_origin['image']
-
-def create_colored_mask(prediction):
-    prob = torch.softmax(prediction, dim=1)
-    pred_mask = torch.argmax(prob, dim=1).squeeze().cpu().numpy()
-    h, w = pred_mask.shape
-    colored_mask = np.zeros((h, w, 3), dtype=np.uint8)
-    colored_mask[pred_mask == 1] = LESION_COLORS['EX']
-    colored_mask[pred_mask == 2] = LESION_COLORS['HE']
-    colored_mask[pred_mask == 3] = LESION_COLORS['MA']
-    colored_mask[pred_mask == 4] = LESION_COLORS['SE']
-    return colored_mask, pred_mask
-
-def count_lesions(pred_mask):
-    lesion_counts = {'EX': 0, 'HE': 0, 'MA': 0, 'SE': 0}
-    for class_idx, lesion_type in LESION_TYPES.items():
-        binary_mask = (pred_mask == class_idx).astype(np.uint8)
-        kernel = np.ones((3, 3), np.uint8)
-        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel)
-        labeled, num_features = ndimage.label(binary_mask)
-        for i in range(1, num_features + 1):
-            area = np.sum(labeled == i)
-            if area >= 10:
-                lesion_counts[lesion_type] += 1
-    return lesion_counts
-
-def predict(model, image_tensor):
-    model.eval()
-    with torch.no_grad():
-        image_tensor = image_tensor.float()
-        output = model(image_tensor)
-        if isinstance(output, tuple):
-            output = output[-1]
-        if output.shape[1] != 5:
-            output = output.permute(0, 3, 1, 2)
-        output = torch.softmax(output, dim=1)
-    return output
-
-def process_image(image_path, file_uuid):
-    image_tensor, original_img = load_image(image_path)
-    image_tensor = image_tensor.to(device)
-    prediction = predict(model, image_tensor)
-    colored_mask, pred_mask = create_colored_mask(prediction)
-    lesion_counts = count_lesions(pred_mask)
-    if isinstance(original_img, torch.Tensor):
-        original_img = original_img.cpu().numpy()
-    if original_img.shape[0] != 640 or original_img.shape[1] != 640:
-        original_img = cv2.resize(original_img, (640, 640))
-    if len(original_img.shape) == 2:
-        original_img = np.stack([original_img]*3, axis=-1)
-    elif original_img.shape[2] == 1:
-        original_img = np.repeat(original_img, 3, axis=2)
-    if original_img.max() <= 1.0:
-        original_img = (original_img * 255).astype(np.uint8)
+def load_scheduler():
+    if INFERENCE_SERVER:
+        import torch
+        from inference_server import InferenceClient, server_addresses
+        torch.set_num_threads(WORKER_TORCH_THREADS)
+        return InferenceClient(
+            server_addresses(INFERENCE_SERVER, INFERENCE_PROCESSES),
+            INFERENCE_AUTHKEY,
+            INFERENCE_TIMEOUT
+        )
+    from inference import bf16_supported
+    from pipeline import create_scheduler
+    return create_scheduler(
+        INFERENCE_BACKEND,
+        INFERENCE_HEAD,
+        MODEL_PATH,
+        script_path=MODEL_SCRIPT_PATH,
+        onnx_path=MODEL_ONNX_PATH,
+        int8_path=MODEL_INT8_PATH,
+        onnx_threads=ONNX_THREADS or None,
+        freeze=MODEL_FREEZE_SWITCHNORM,
+        channels_last=MODEL_CHANNELS_LAST,
+        bf16=MODEL_BF16 and bf16_supported(),
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_ms=BATCH_MAX_WAIT_MS
+    )
+
+def load_pipeline(scheduler=None):
+    timer = StartupTimer('inference')
+    from pipeline import InferencePipeline
+    timer.mark('imports')
+    if scheduler is None:
+        scheduler = load_scheduler()
+        timer.mark('model load')
+    inference_pipeline = InferencePipeline(scheduler, TILE_SIZE, TILE_OVERLAP, TILE_BATCH_SIZE)
+    inference_pipeline.warm_up()
+    timer.mark('warm-up')
+    return inference_pipeline
+
+if MODEL_PRELOAD:
+    preloaded_scheduler = load_scheduler()
+    startup_timer.mark('model load')
+else:
+    preloaded_scheduler = None
+pipeline_loader = BackgroundLoader('inference pipeline', lambda: load_pipeline(preloaded_scheduler))
+
+history_store = HistoryStore(HISTORY_DB_PATH)
+history_store.migrate_directory('diagnosis-record')
+report_jobs = ReportJobQueue(
+    'diagnostic-report',
+    HISTORY_DB_PATH,
+    REPORT_WORKERS,
+    REPORT_IMAGE_DPI,
+    REPORT_JOB_TIMEOUT,
+    ARTIFACT_WAIT_TIMEOUT,
+    REPORT_QUEUE_TIMEOUT
+)
+artifact_writer = ArtifactWriter(ARTIFACT_QUEUE_SIZE, ARTIFACT_BATCH_SIZE, ARTIFACT_BATCH_WAIT_MS, ARTIFACT_FSYNC)
+llm_gateway = None
+llm_gateway_lock = threading.Lock()
+result_cache = ResultCache(DiskCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES), RESULT_CACHE_MEMORY_ITEMS)
+diagnosis_cache = ResultCache(
+    DiskCache(DIAGNOSIS_CACHE_DIR, DIAGNOSIS_CACHE_MAX_BYTES, ttl=DIAGNOSIS_CACHE_TTL),
+    DIAGNOSIS_CACHE_MEMORY_ITEMS,
+    ttl=DIAGNOSIS_CACHE_TTL
+)
+startup_timer.mark('stores')
+
+def get_llm_gateway():
+    global llm_gateway
+    with llm_gateway_lock:
+        if llm_gateway is None:
+            from llm_gateway import LLMGateway
+            llm_gateway = LLMGateway(
+                VOLCENGINE_API_URL,
+                VOLCENGINE_API_KEY,
+                VOLCENGINE_MODEL,
+                max_concurrency=LLM_MAX_CONCURRENCY,
+                acquire_timeout=LLM_ACQUIRE_TIMEOUT,
+                connect_timeout=LLM_CONNECT_TIMEOUT,
+                read_timeout=LLM_READ_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES
+            )
+        return llm_gateway
+
+ARTIFACT_DIRS = ['original-image', 'preprocessed-image', 'predicted-image']
+UPLOAD_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'BMP': 'bmp', 'TIFF': 'tif'}
+ARTIFACT_MAX_AGE = int(os.getenv('ARTIFACT_MAX_AGE', str(7 * 24 * 3600)))
+RESPONSE_MODES = ['base64', 'url', 'multipart']
+
+def artifact_url(kind, file_uuid):
+    return f'{REPORT_BASE_URL}/artifacts/{kind}/{file_uuid}.jpg'
+
+def process_image(inference_pipeline, file_data, file_uuid, cache_key=None, tiled=False, resolution=None):
+    if cache_key is None:
+        result = inference_pipeline.analyze(file_data, tiled=tiled, resolution=resolution)
     else:
-        original_img = original_img.astype(np.uint8)
-    overlay = original_img.copy()
-    mask = (colored_mask != 0).any(axis=2)
-    overlay[mask] = cv2.addWeighted(original_img[mask], 0.5, colored_mask[mask], 0.5, 0)
-    preprocessed_path = os.path.join('preprocessed-image', f'{file_uuid}.jpg')
-    predicted_path = os.path.join('predicted-image', f'{file_uuid}.jpg')
-    PILImage.fromarray(original_img).save(preprocessed_path)
-    PILImage.fromarray(overlay).save(predicted_path)
-    img_byte_arr = io.BytesIO()
-    PILImage.fromarray(original_img).save(img_byte_arr, format='JPEG')
-    preprocessed_img = img_byte_arr.getvalue()
-    img_byte_arr = io.BytesIO()
-    PILImage.fromarray(overlay).save(img_byte_arr, format='JPEG')
-    predicted_img = img_byte_arr.getvalue()
+        result = result_cache.get_or_compute(
+            cache_key,
+            lambda: inference_pipeline.analyze(file_data, tiled=tiled, resolution=resolution)
+        )
+    for kind in ['preprocessed-image', 'predicted-image']:
+        artifact_writer.submit(os.path.join(kind, f'{file_uuid}.jpg'), result[kind.replace('-', '_')], ARTIFACT_QUEUE_TIMEOUT)
+    return result
+
+def prediction_metadata(result, file_uuid):
     return {
         'uuid': file_uuid,
-        'preprocessed_image': base64.b64encode(preprocessed_img).decode('utf-8'),
-        'predicted_image': base64.b64encode(predicted_img).decode('utf-8'),
-        'lesion_counts': lesion_counts
+        'lesion_counts': dict(result['lesion_counts']),
+        'lesions': result.get('lesions', {})
     }
 
-def get_severity_text(severity_code):
-    severity_map = {
-        '0': '健康',
-        '1': '轻度非增殖性 DR（Mild-NPDR）',
-        '2': '中度非增殖性 DR（Moderate-NPDR）',
-        '3': '重度非增殖性 DR（Severe-NPDR）',
-        '4': '增殖性 DR（PDR）'
-    }
-    return severity_map.get(severity_code, '未知')
+def prediction_response(result, file_uuid, mode):
+    metadata = prediction_metadata(result, file_uuid)
+    if mode == 'url':
+        metadata['preprocessed_image_url'] = artifact_url('preprocessed-image', file_uuid)
+        metadata['predicted_image_url'] = artifact_url('predicted-image', file_uuid)
+        return jsonify(metadata)
+    if mode == 'multipart':
+        boundary = uuid.uuid4().hex
+        parts = [
+            ('application/json', 'metadata', None, json.dumps(metadata, ensure_ascii=False).encode('utf-8')),
+            ('image/jpeg', 'preprocessed_image', f'{file_uuid}.jpg', result['preprocessed_image']),
+            ('image/jpeg', 'predicted_image', f'{file_uuid}.jpg', result['predicted_image'])
+        ]
+        body = []
+        for content_type, name, filename, payload in parts:
+            disposition = f'form-data; name="{name}"'
+            if filename:
+                disposition += f'; filename="{filename}"'
+            body.append(
+                f'--{boundary}\r\nContent-Type: {content_type}\r\nContent-Disposition: {disposition}\r\n'
+                f'Content-Length: {len(payload)}\r\n\r\n'.encode('utf-8')
+            )
+            body.append(payload)
+            body.append(b'\r\n')
+        body.append(f'--{boundary}--\r\n'.encode('utf-8'))
+        return Response(b''.join(body), mimetype=f'multipart/form-data; boundary={boundary}')
+    metadata['preprocessed_image'] = base64.b64encode(result['preprocessed_image']).decode('utf-8')
+    metadata['predicted_image'] = base64.b64encode(result['predicted_image']).decode('utf-8')
+    return jsonify(metadata)
 
 @app.route('/predict', methods=['POST'])
 def handle_prediction():
@@ -184,54 +255,122 @@ def handle_prediction():
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
+    response_mode = request.args.get('response', 'base64')
+    if response_mode not in RESPONSE_MODES:
+        return jsonify({'error': f'Invalid response mode: {response_mode}'}), 400
+    try:
+        inference_pipeline = pipeline_loader.get(MODEL_READY_TIMEOUT)
+    except NotReadyError as e:
+        return jsonify({'error': str(e)}), 503
+    tiled = request.args.get('tiled', '1' if TILED_INFERENCE else '0') == '1'
+    default_resolution = TRIAGE_RESOLUTION if request.args.get('triage') == '1' else inference_pipeline.input_size
+    resolution = request.args.get('resolution', default_resolution, type=int)
+    if not inference_pipeline.valid_resolution(resolution):
+        return jsonify({'error': f'Invalid resolution: {resolution}'}), 400
     file_uuid = str(uuid.uuid4())
     try:
-        img = PILImage.open(file.stream)
-        if img.format == 'PNG':
-            background = PILImage.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-            img = background
-            filename = f'{file_uuid}.jpg'
-            filepath = os.path.join('original-image', filename)
-            img.save(filepath, 'JPEG')
-        else:
-            filename = f'{file_uuid}.jpg'
-            filepath = os.path.join('original-image', filename)
-            img.save(filepath)
-        result = process_image(filepath, file_uuid)
-        return jsonify(result)
+        started = time.perf_counter()
+        file_data = file.read()
+        with PILImage.open(io.BytesIO(file_data)) as img:
+            extension = UPLOAD_EXTENSIONS.get(img.format, (img.format or 'bin').lower())
+        artifact_writer.submit(os.path.join('original-image', f'{file_uuid}.{extension}'), file_data, ARTIFACT_QUEUE_TIMEOUT)
+        uploaded = time.perf_counter()
+        variant = [MODEL_IDENTITY] if INFERENCE_HEAD == 'out_conv3' else [MODEL_IDENTITY, f'head-{INFERENCE_HEAD}']
+        if MODEL_BF16:
+            variant.append('bf16')
+        if tiled:
+            variant.append(f'tiled-{TILE_SIZE}-{TILE_OVERLAP}')
+        elif resolution != inference_pipeline.input_size:
+            variant.append(f'resolution-{resolution}')
+        cache_key = content_hash(file_data, *variant)
+        result = process_image(
+            inference_pipeline,
+            file_data,
+            file_uuid,
+            cache_key=cache_key,
+            tiled=tiled,
+            resolution=resolution
+        )
+        analyzed = time.perf_counter()
+        response = prediction_response(result, file_uuid, response_mode)
+        finished = time.perf_counter()
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}' for name, duration in [
+                ('upload', uploaded - started),
+                ('analyze', analyzed - uploaded),
+                ('response', finished - analyzed),
+                ('total', finished - started)
+            ]
+        )
+        return response
+    except ArtifactQueueFullError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/generate_diagnosis', methods=['POST'])
-def generate_diagnosis():
-    try:
-        data = request.json
-        required_fields = [
-            'name',
-            'gender',
-            'age',
-            'occupation',
-            'contact',
-            'address',
-            'chief_complaint',
-            'present_illness',
-            'past_history',
-            'ma_count',
-            'he_count',
-            'ex_count',
-            'se_count',
-            'ma_severity',
-            'he_severity',
-            'ex_severity',
-            'se_severity',
-            'clinical_diagnosis',
-            'treatment_plan'
-        ]
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        prompt = f'''Prompt 定义：
+@app.before_request
+def start_pipeline_loader():
+    pipeline_loader.start()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    status = pipeline_loader.status()
+    return jsonify({'status': 'failed' if status == 'failed' else 'ok'}), 500 if status == 'failed' else 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = pipeline_loader.status()
+    body = {'status': status, 'startup_ms': startup_timer.breakdown()}
+    if status == 'failed':
+        body['error'] = str(pipeline_loader.error)
+    return jsonify(body), 200 if status == 'ready' else 503
+
+@app.route('/artifacts/<kind>/<name>', methods=['GET'])
+def get_artifact(kind, name):
+    if kind not in ARTIFACT_DIRS:
+        return jsonify({'error': 'Artifact not found'}), 404
+    path = os.path.join(kind, os.path.basename(name))
+    data = artifact_writer.get(path)
+    if data is not None:
+        response = send_file(io.BytesIO(data), download_name=os.path.basename(path), conditional=True,
+                             etag=content_hash(data), max_age=ARTIFACT_MAX_AGE)
+    else:
+        try:
+            wait_for_files([path], ARTIFACT_READ_TIMEOUT)
+        except FileNotFoundError:
+            return jsonify({'error': 'Artifact not found'}), 404
+        response = send_file(path, conditional=True, etag=True, max_age=ARTIFACT_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+DIAGNOSIS_FIELDS = [
+    'name',
+    'gender',
+    'age',
+    'occupation',
+    'contact',
+    'address',
+    'chief_complaint',
+    'present_illness',
+    'past_history',
+    'ma_count',
+    'he_count',
+    'ex_count',
+    'se_count',
+    'ma_severity',
+    'he_severity',
+    'ex_severity',
+    'se_severity',
+    'clinical_diagnosis',
+    'treatment_plan'
+]
+
+DIAGNOSIS_FAILED = 'AI 辅助诊断意见生成失败。'
+
+def build_diagnosis_prompt(data):
+    from lesions import get_severity_text
+    return f'''Prompt 定义：
 【角色定义】
 你是糖尿病性视网膜病变诊断智能平台的医疗助手，基于循证医学提供疾病知识科普、诊断流程解释和预防建议，不替代专业医疗建议。
 【医学背景】
@@ -268,26 +407,85 @@ def generate_diagnosis():
 辅助诊断意见：[基于病灶评估及病史，给出 AI 支持的 DR 辅助诊断意见等]
 治疗方案建议：[提出疾病控制目标、随访周期及必要干预措施，给出 AI 支持的 DR 治疗方案建议等]
 注意事项：本回复基于公开医学指南，AI 辅助诊断意见仅供参考，不替代专业医疗建议。请结合临床医生评估制定个性化治疗方案。[禁止修改注意事项]'''
-        headers = {
-            'Authorization': f'Bearer {VOLCENGINE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            'model': 'doubao-1-5-pro-32k-250115',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ]
+
+def build_diagnosis_messages(data):
+    return [
+        {
+            'role': 'user',
+            'content': build_diagnosis_prompt(data)
         }
-        response = requests.post(VOLCENGINE_API_URL, headers=headers, json=payload)
-        if response.status_code != 200:
-            return jsonify({'ai_response': 'AI 辅助诊断意见生成失败。'})
-        response_data = response.json()
-        return jsonify({'ai_response': response_data['choices'][0]['message']['content']})
+    ]
+
+def normalize_diagnosis_input(data):
+    return {field: str(data[field]).strip() for field in DIAGNOSIS_FIELDS}
+
+def diagnosis_cache_key(data):
+    return content_hash(VOLCENGINE_MODEL, json.dumps(normalize_diagnosis_input(data), sort_keys=True, ensure_ascii=False))
+
+def bypass_diagnosis_cache(data):
+    return bool(data.get('bypass_cache')) or request.args.get('cache') == '0'
+
+@app.route('/generate_diagnosis', methods=['POST'])
+def generate_diagnosis():
+    try:
+        data = request.json
+        for field in DIAGNOSIS_FIELDS:
+            if field not in data:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        from llm_gateway import LLM_ERRORS, LLMGatewayBusyError
+        messages = build_diagnosis_messages(normalize_diagnosis_input(data))
+        cache_key = diagnosis_cache_key(data)
+        try:
+            if bypass_diagnosis_cache(data):
+                ai_response = get_llm_gateway().complete(messages)
+                diagnosis_cache.set(cache_key, ai_response)
+            else:
+                ai_response = diagnosis_cache.get_or_compute(cache_key, lambda: get_llm_gateway().complete(messages))
+        except LLMGatewayBusyError as e:
+            return jsonify({'error': str(e), 'ai_response': DIAGNOSIS_FAILED}), 503, {'Retry-After': '5'}
+        except LLM_ERRORS:
+            return jsonify({'ai_response': DIAGNOSIS_FAILED})
+        return jsonify({'ai_response': ai_response})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/generate_diagnosis/stream', methods=['POST'])
+def generate_diagnosis_stream():
+    from llm_gateway import LLMGatewayBusyError
+    try:
+        data = request.json
+        for field in DIAGNOSIS_FIELDS:
+            if field not in data:
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+        messages = build_diagnosis_messages(normalize_diagnosis_input(data))
+        cache_key = diagnosis_cache_key(data)
+        cached = None if bypass_diagnosis_cache(data) else diagnosis_cache.get(cache_key)
+        slot = None if cached is not None else get_llm_gateway().reserve()
+    except LLMGatewayBusyError as e:
+        return jsonify({'error': str(e), 'ai_response': DIAGNOSIS_FAILED}), 503, {'Retry-After': '5'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    def generate():
+        try:
+            if cached is not None:
+                yield f"data: {json.dumps({'content': cached}, ensure_ascii=False)}\n\n"
+            else:
+                chunks = []
+                for content in get_llm_gateway().stream(messages, slot):
+                    chunks.append(content)
+                    yield f"data: {json.dumps({'content': content}, ensure_ascii=False)}\n\n"
+                diagnosis_cache.set(cache_key, ''.join(chunks))
+        except Exception:
+            yield f"event: error\ndata: {json.dumps({'ai_response': DIAGNOSIS_FAILED}, ensure_ascii=False)}\n\n"
+        yield 'data: [DONE]\n\n'
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    if slot is not None:
+        response.call_on_close(slot.release)
+    return response
 
 @app.route('/generate_report', methods=['POST'])
 def generate_report():
@@ -319,181 +517,28 @@ def generate_report():
         for field in required_fields:
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
-        pdf_path = os.path.join('diagnostic-report', f"{data['uuid']}.pdf")
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        styles = getSampleStyleSheet()
-        styles.add(ParagraphStyle(name='Center', fontName='wqy-zenhei', alignment=TA_CENTER))
-        styles.add(ParagraphStyle(name='Left', fontName='wqy-zenhei', alignment=TA_LEFT))
-        styles.add(ParagraphStyle(name='Comment', fontName='wqy-zenhei', fontSize=9, alignment=TA_LEFT))
-        styles['Title'].fontSize = 18
-        styles['Title'].alignment = TA_CENTER
-        styles['Title'].spaceAfter = 20
-        styles['Title'].fontName = 'wqy-zenhei'
-        styles.add(ParagraphStyle(name='Subtitle', fontName='wqy-zenhei', fontSize=10, alignment=TA_CENTER, spaceAfter=10))
-        styles.add(ParagraphStyle(name='Section', fontName='wqy-zenhei', fontSize=12, alignment=TA_LEFT, spaceBefore=10, spaceAfter=5))
-        story = []
-        story.append(Paragraph('糖尿病性视网膜病变诊断分析报告', styles['Title']))
-        story.append(Paragraph(f'本报告由糖尿病性视网膜病变诊断智能平台 DiabRetina AI 生成', styles['Subtitle']))
-        story.append(Spacer(1, 16))
-        story.append(Paragraph(f"报告编号：{data['uuid']}", styles['Subtitle']))
         now = datetime.now()
         beijing_time = now + timedelta(hours=8)
         generate_time = beijing_time.strftime('%Y-%m-%d %H:%M:%S')
-        story.append(Paragraph(f"生成时间：{generate_time}", styles['Subtitle']))
-        story.append(Spacer(1, 40))
-        story.append(Paragraph('患者基本信息', styles['Section']))
-        story.append(Spacer(1, 12))
-        patient_data = [
-            ['姓名', data['name']],
-            ['性别', data['gender']],
-            ['年龄', data['age']],
-            ['职业', data['occupation']],
-            ['联系方式', data['contact']],
-            ['家庭住址', data['address']]
-        ]
-        patient_table = Table(patient_data, colWidths=[1.5*inch, 4*inch])
-        patient_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'wqy-zenhei'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
-        ]))
-        story.append(patient_table)
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('眼底图像', styles['Section']))
-        story.append(Spacer(1, 12))
-        original_img_path = os.path.join('preprocessed-image', f"{data['uuid']}.jpg")
-        predicted_img_path = os.path.join('predicted-image', f"{data['uuid']}.jpg")
-        img_table_data = [
-            [Paragraph('眼底原始图像', styles['Center']), Paragraph('眼底检测图像', styles['Center'])],
-            [Image(original_img_path, width=3*inch, height=3*inch), Image(predicted_img_path, width=3*inch, height=3*inch)]
-        ]
-        img_table = Table(img_table_data, colWidths=[3.5*inch, 3.5*inch])
-        img_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'wqy-zenhei'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('LEADING', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 5),
-            ('TOPPADDING', (0, 0), (-1, 0), 5),
-            ('BOTTOMPADDING', (1, 0), (1, 0), 0)
-        ]))
-        story.append(img_table)
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('病灶类型说明', styles['Section']))
-        story.append(Spacer(1, 12))
-        lesion_colors = {
-            'MA': (0, 223, 162),
-            'HE': (0, 121, 255),
-            'EX': (255, 0, 96),
-            'SE': (246, 250, 112)
-        }
-        lesion_descriptions = [
-            ('微动脉瘤（Microaneurysm，MA）', '视网膜毛细血管壁局部膨出形成的微小瘤状结构，是糖尿病视网膜病变最早的病理特征。'),
-            ('出血点（Hemorrhage，HE）', '视网膜深层毛细血管破裂导致的点状或片状出血，位于内核层或外丛状层。'),
-            ('硬性渗出（Hard Exudates，EX）', '脂质和蛋白质渗漏沉积于外丛状层，呈蜡黄色点片状，边界清晰，提示慢性视网膜水肿。'),
-            ('软性渗出（Soft Exudates，SE）', '神经纤维层微梗死导致的轴浆蓄积，呈白色絮状、边界模糊，阻碍下方血管观察。')
-        ]
-        lesion_explanation_data = []
-        for i, (title, desc) in enumerate(lesion_descriptions):
-            lesion_type = title.split('（')[-1].split('）')[0].split('，')[-1]
-            color = lesion_colors[lesion_type]
-            d = Drawing(18, 18)
-            d.add(Rect(
-                0, 0, 20, 20,
-                fillColor=colors.Color(color[0]/255, color[1]/255, color[2]/255),
-                strokeColor=colors.lightgrey,
-                strokeWidth=1
-            ))
-            lesion_explanation_data.append([d, Paragraph(f'{title}\n{desc}', styles['Comment'])])
-        lesion_explanation_table = Table(lesion_explanation_data, colWidths=[0.5*inch, 5.5*inch])
-        lesion_explanation_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'wqy-zenhei'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('GRID', (0, 0), (-1, -1), 0, colors.white),
-            ('BOX', (0, 0), (-1, -1), 0, colors.white)
-        ]))
-        story.append(lesion_explanation_table)
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('患者病史信息', styles['Section']))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph('主诉：', styles['Left']))
-        story.append(Spacer(1, 4))
-        story.append(Paragraph(data['chief_complaint'], styles['Left']))
-        story.append(Spacer(1, 8))
-        story.append(Paragraph('现病史：', styles['Left']))
-        story.append(Spacer(1, 4))
-        story.append(Paragraph(data['present_illness'], styles['Left']))
-        story.append(Spacer(1, 8))
-        story.append(Paragraph('既往史：', styles['Left']))
-        story.append(Spacer(1, 4))
-        story.append(Paragraph(data['past_history'], styles['Left']))
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('病灶严重程度分级', styles['Section']))
-        story.append(Spacer(1, 12))
-        lesion_data = [
-            ['病灶类型', '数量', '严重程度分级'],
-            ['微动脉瘤（MA）', data['ma_count'], get_severity_text(data['ma_severity'])],
-            ['出血点（HE）', data['he_count'], get_severity_text(data['he_severity'])],
-            ['硬性渗出（EX）', data['ex_count'], get_severity_text(data['ex_severity'])],
-            ['软性渗出（SE）', data['se_count'], get_severity_text(data['se_severity'])]
-        ]
-        lesion_table = Table(lesion_data, colWidths=[1.5*inch, 1*inch, 3*inch])
-        lesion_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, -1), 'wqy-zenhei'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey)
-        ]))
-        story.append(lesion_table)
-        story.append(Spacer(1, 8))
-        story.append(Paragraph('根据国际临床 DR 严重程度量表，DR 共分为 5 级：健康、轻度非增殖性 DR（Mild non-proliferative DR，Mild-NPDR）、中度非增殖性 DR（Moderate non-proliferative DR，Moderate-NPDR）、重度非增殖性 DR（Severe non-proliferative DR，Severe-NPDR）和增殖性 DR（Proliferative DR，PDR）。', styles['Comment']))
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('临床诊断意见', styles['Section']))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph(data['clinical_diagnosis'], styles['Left']))
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('治疗方案', styles['Section']))
-        story.append(Spacer(1, 12))
-        story.append(Paragraph(data['treatment_plan'], styles['Left']))
-        story.append(Spacer(1, 24))
-        story.append(Paragraph('AI 辅助诊断意见', styles['Section']))
-        story.append(Spacer(1, 12))
-        ai_diagnosis_paragraphs = data['ai_diagnosis'].split('\n')
-        for para in ai_diagnosis_paragraphs:
-            if para.strip():
-                story.append(Paragraph(para.strip(), styles['Left']))
-                story.append(Spacer(1, 5))
-        story.append(Spacer(1, 48))
-        pdf_link = f"http://110.42.214.164:8005/diagnostic-report/{data['uuid']}"
-        story.append(Paragraph(f'报告下载链接：{pdf_link}', ParagraphStyle(name='Footer', fontName='wqy-zenhei', fontSize=9, textColor=colors.grey)))
-        doc.build(story)
-        record_path = os.path.join('diagnosis-record', f"{data['uuid']}.txt")
-        with open(record_path, 'w', encoding='utf-8') as f:
-            f.write(f"{data['name']}\n")
-            f.write(f"{data['gender']}\n")
-            f.write(f"{data['age']}\n")
-            f.write(f"{data['occupation']}\n")
-            f.write(f"{data['contact']}\n")
-            f.write(f"{data['address']}\n")
-            f.write(f'{generate_time}\n')
-        return jsonify({'report_path': pdf_link})
+        job_id = report_jobs.submit(data, generate_time)
+        return jsonify({
+            'job_id': job_id,
+            'status': 'pending',
+            'report_path': f'{REPORT_BASE_URL}/diagnostic-report/{job_id}'
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/diagnostic-report/<uuid>', methods=['GET'])
 def get_report(uuid):
     try:
+        status, error = report_jobs.status(uuid)
+        if status == 'pending':
+            return jsonify({'job_id': uuid, 'status': 'pending'}), 202
+        if status == 'failed':
+            return jsonify({'job_id': uuid, 'status': 'failed', 'error': error}), 500
         pdf_path = os.path.join('diagnostic-report', f'{uuid}.pdf')
-        if not os.path.exists(pdf_path):
+        if status != 'done':
             return jsonify({'error': 'Diagnostic report not found'}), 404
         return send_file(
             pdf_path,
@@ -507,35 +552,36 @@ def get_report(uuid):
 @app.route('/history', methods=['GET'])
 def get_history():
     try:
-        record_files = [f for f in os.listdir('diagnosis-record') if f.endswith('.txt')]
-        history_records = []
-        for filename in record_files:
-            filepath = os.path.join('diagnosis-record', filename)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f.readlines()]
-                if len(lines) >= 7:
-                    uuid = filename[:-4]
-                    name = lines[0] if len(lines) > 0 else ''
-                    gender = lines[1] if len(lines) > 1 else ''
-                    age = lines[2] if len(lines) > 2 else ''
-                    occupation = lines[3] if len(lines) > 3 else ''
-                    contact = lines[4] if len(lines) > 4 else ''
-                    address = lines[5] if len(lines) > 5 else ''
-                    time = lines[6] if len(lines) > 6 else ''
-                    history_records.append({
-                        'uuid': uuid,
-                        'name': name,
-                        'gender': gender,
-                        'age': age,
-                        'occupation': occupation,
-                        'contact': contact,
-                        'address': address,
-                        'time': time
-                    })
-        history_records.sort(key=lambda x: x['time'], reverse=True)
-        return jsonify({'history': history_records})
+        limit = request.args.get('limit', type=int)
+        if limit is not None:
+            limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+        try:
+            history_records, next_cursor = history_store.list(limit=limit, cursor=request.args.get('cursor'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        return jsonify({'history': history_records, 'next_cursor': next_cursor})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/history/search', methods=['GET'])
+def search_history():
+    try:
+        limit = max(1, min(request.args.get('limit', 20, type=int), HISTORY_MAX_LIMIT))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        fields = {field: request.args.get(field) for field in SEARCH_FIELDS if request.args.get(field)}
+        history_records, next_offset = history_store.search(
+            query=request.args.get('q'),
+            fields=fields,
+            start_time=request.args.get('from'),
+            end_time=request.args.get('to'),
+            limit=limit,
+            offset=offset
+        )
+        return jsonify({'history': history_records, 'next_offset': next_offset})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+startup_timer.mark('app ready')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8005)
\ No newline at end of file
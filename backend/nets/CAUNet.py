@@ -9,6 +9,8 @@ from .Layers import SwitchNorm2d
 
 class CAUNet(nn.Module):
 
+    HEADS = ('out_conv1', 'out_conv2', 'out_conv3', 'pred')
+
     def __init__(self, input_channel=3, output_channel=1, bn_momentum=0.2, feature=False):
         super(CAUNet, self).__init__()
         self.original_size = 640
@@ -198,7 +200,7 @@ class CAUNet(nn.Module):
         out1_gate3 = self.pool_out1_gate3(out1)
         out2_gate3 = self.pool_out2_gate3(out2)
         up4 = self.up4(out4)
-        up4 = nn.functional.interpolate(up4, size=(int(self.original_size / 8), int(self.original_size / 8)), mode='nearest')
+        up4 = nn.functional.interpolate(up4, size=out3.shape[2:], mode='nearest')
         deconv4 = self.deconv4(out4)
         up4_sig = up4 + deconv4
         up4 = torch.cat((up4_sig, deconv4), dim=1)
@@ -210,7 +212,7 @@ class CAUNet(nn.Module):
         comb3 = self.back1(gate3)
         f5 = comb3
         up3 = self.up3(comb3)
-        up3 = nn.functional.interpolate(up3, size=(int(self.original_size / 4), int(self.original_size / 4)), mode='nearest')
+        up3 = nn.functional.interpolate(up3, size=out2.shape[2:], mode='nearest')
         deconv3 = self.deconv3(comb3)
         up3_sig = up3 + deconv3
         up3 = torch.cat((up3, deconv3), dim=1)
@@ -222,7 +224,7 @@ class CAUNet(nn.Module):
         comb2 = self.back2(gate2)
         f6 = comb2
         up2 = self.up2(comb2)
-        up2 = nn.functional.interpolate(up2, size=(int(self.original_size / 2), int(self.original_size / 2)), mode='nearest')
+        up2 = nn.functional.interpolate(up2, size=out1.shape[2:], mode='nearest')
         deconv2 = self.deconv2(comb2)
         up2_sig = up2 + deconv2
         up2 = torch.cat((up2, deconv2), dim=1)
@@ -234,7 +236,7 @@ class CAUNet(nn.Module):
         comb1 = self.back3(gate1)
         f7 = comb1
         up1 = self.up1(comb1)
-        up1 = nn.functional.interpolate(up1, size=(self.original_size, self.original_size), mode='nearest')
+        up1 = nn.functional.interpolate(up1, size=preblock.shape[2:], mode='nearest')
         deconv1 = self.deconv1(comb1)
         up1_sig = up1 + deconv1
         up1 = torch.cat((up1, deconv1), dim=1)
@@ -256,4 +258,67 @@ class CAUNet(nn.Module):
         if all_features:
             return [f0, f1, f2, f3, f4, f5, f6, f7, f8], out.permute(0, 2, 3, 1)
         return out.permute(0, 2, 3, 1), out3.permute(0, 2, 3, 1), \
-               out2.permute(0, 2, 3, 1), out1.permute(0, 2, 3, 1)
\ No newline at end of file
+               out2.permute(0, 2, 3, 1), out1.permute(0, 2, 3, 1)
+
+    def infer(self, x, head='out_conv3'):
+        if head not in self.HEADS:
+            raise ValueError(f'Unknown CAUNet head: {head}')
+        preblock = self.preBlock(x)
+        out1 = self.forw1(self.maxpool1(preblock)[0])
+        out2 = self.forw2(self.maxpool2(out1)[0])
+        out3 = self.forw3(self.maxpool3(out2)[0])
+        out4 = self.forw4(self.maxpool4(out3)[0])
+        up4 = nn.functional.interpolate(self.up4(out4), size=out3.shape[2:], mode='nearest')
+        deconv4 = self.deconv4(out4)
+        up4_sig = up4 + deconv4
+        gate3 = torch.cat((
+            up4_sig,
+            deconv4,
+            self.att3_1(g=up4_sig, x=self.pool_preblock_gate3(preblock)),
+            self.att3_2(g=up4_sig, x=self.pool_out1_gate3(out1)),
+            self.att3_3(g=up4_sig, x=self.pool_out2_gate3(out2)),
+            self.att3_4(g=up4_sig, x=out3)
+        ), dim=1)
+        comb3 = self.back1(gate3)
+        if head == 'out_conv1':
+            return self.out_conv1(comb3)
+        up3 = nn.functional.interpolate(self.up3(comb3), size=out2.shape[2:], mode='nearest')
+        deconv3 = self.deconv3(comb3)
+        up3_sig = up3 + deconv3
+        gate2 = torch.cat((
+            up3,
+            deconv3,
+            self.att2_1(g=up3_sig, x=self.pool_preblock_gate2(preblock)),
+            self.att2_2(g=up3_sig, x=self.pool_out1_gate2(out1)),
+            self.att2_3(g=up3_sig, x=out2),
+            self.att2_4(g=up3_sig, x=self.up_out3_gate2(out3))
+        ), dim=1)
+        comb2 = self.back2(gate2)
+        if head == 'out_conv2':
+            return self.out_conv2(comb2)
+        up2 = nn.functional.interpolate(self.up2(comb2), size=out1.shape[2:], mode='nearest')
+        deconv2 = self.deconv2(comb2)
+        up2_sig = up2 + deconv2
+        gate1 = torch.cat((
+            up2,
+            deconv2,
+            self.att1_1(g=up2_sig, x=self.pool_preblock_gate1(preblock)),
+            self.att1_2(g=up2_sig, x=out1),
+            self.att1_3(g=up2_sig, x=self.up_out2_gate1(out2)),
+            self.att1_4(g=up2_sig, x=self.up_out3_gate1(out3))
+        ), dim=1)
+        comb1 = self.back3(gate1)
+        if head == 'out_conv3':
+            return self.out_conv3(comb1)
+        up1 = nn.functional.interpolate(self.up1(comb1), size=preblock.shape[2:], mode='nearest')
+        deconv1 = self.deconv1(comb1)
+        up1_sig = up1 + deconv1
+        gate0 = torch.cat((
+            up1,
+            deconv1,
+            self.att0_1(g=up1_sig, x=preblock),
+            self.att0_2(g=up1_sig, x=self.up_out1_gate0(out1)),
+            self.att0_3(g=up1_sig, x=self.up_out2_gate0(out2)),
+            self.att0_4(g=up1_sig, x=self.up_out3_gate0(out3))
+        ), dim=1)
+        return self.pred(self.back4(gate0))
@@ -83,6 +83,61 @@ class SwitchNorm2d(nn.Module):
         x = x.view(N, C, H, W)
         return x * self.weight + self.bias
 
+class FrozenSwitchNorm2d(nn.Module):
+
+    def __init__(self, num_features, eps=1e-5, inplace=True):
+        super(FrozenSwitchNorm2d, self).__init__()
+        self.eps = eps
+        self.inplace = inplace
+        self.mean_in_weight = 1.0
+        self.mean_ln_weight = 0.0
+        self.var_in_weight = 1.0
+        self.var_ln_weight = 0.0
+        self.register_buffer('weight', torch.ones(1, num_features, 1, 1))
+        self.register_buffer('bias', torch.zeros(1, num_features, 1, 1))
+        self.register_buffer('mean_bn', torch.zeros(1, num_features, 1, 1))
+        self.register_buffer('var_bn', torch.zeros(1, num_features, 1, 1))
+
+    @classmethod
+    def from_switchnorm(cls, module, inplace=True):
+        frozen = cls(module.weight.size(1), eps=module.eps, inplace=inplace)
+        with torch.no_grad():
+            mean_weight = torch.softmax(module.mean_weight, 0)
+            var_weight = torch.softmax(module.var_weight, 0)
+            frozen.mean_in_weight = mean_weight[0].item()
+            frozen.mean_ln_weight = mean_weight[1].item()
+            frozen.var_in_weight = var_weight[0].item()
+            frozen.var_ln_weight = var_weight[1].item()
+            frozen.weight.copy_(module.weight)
+            frozen.bias.copy_(module.bias)
+            if module.using_bn:
+                frozen.mean_bn.copy_(mean_weight[2] * module.running_mean.view(1, -1, 1, 1))
+                frozen.var_bn.copy_(var_weight[2] * module.running_var.view(1, -1, 1, 1))
+        return frozen.to(module.weight.device)
+
+    def forward(self, x):
+        stats = x if x.dtype == torch.float32 else x.float()
+        var_in, mean_in = torch.var_mean(stats, dim=(2, 3), keepdim=True)
+        mean_ln = mean_in.mean(1, keepdim=True)
+        var_ln = (var_in + mean_in ** 2).mean(1, keepdim=True) - mean_ln ** 2
+        mean = self.mean_bn + self.mean_in_weight * mean_in + self.mean_ln_weight * mean_ln
+        var = self.var_bn + self.var_in_weight * var_in + self.var_ln_weight * var_ln
+        scale = self.weight * (var + self.eps).rsqrt()
+        shift = self.bias - mean * scale
+        if x.dtype != scale.dtype:
+            scale, shift = scale.to(x.dtype), shift.to(x.dtype)
+        if self.inplace:
+            return x.mul_(scale).add_(shift)
+        return torch.addcmul(shift, x, scale)
+
+def freeze_switchnorm(module, inplace=True):
+    for name, child in module.named_children():
+        if isinstance(child, SwitchNorm2d):
+            setattr(module, name, FrozenSwitchNorm2d.from_switchnorm(child, inplace=inplace))
+        else:
+            freeze_switchnorm(child, inplace=inplace)
+    return module
+
 class Post2d(nn.Module):
 
     def __init__(self, n_in, n_out, stride = 1):
@@ -136,9 +191,9 @@ class SN_CS_Parallel_Attention_block(nn.Module):
         self.relu = nn.ReLU(inplace=True)
 
     def forward(self, g, x):
-        avg_pool_x = F.avg_pool2d( x, (x.size(2), x.size(3)), stride=(x.size(2), x.size(3)))
+        avg_pool_x = x.mean((2, 3), keepdim=True)
         channel_att_x = self.mlp_x(avg_pool_x)
-        avg_pool_g = F.avg_pool2d( g, (g.size(2), g.size(3)), stride=(g.size(2), g.size(3)))
+        avg_pool_g = g.mean((2, 3), keepdim=True)
         channel_att_g = self.mlp_g(avg_pool_g)
         channel_att_sum = channel_att_x + channel_att_g
         scale = torch.sigmoid(channel_att_sum).unsqueeze(2).unsqueeze(3).expand_as(x)
@@ -264,4 +264,23 @@ class ToTensor(object):
         if not self.green:
             image = np.rollaxis(image, 2, 0)
         image = torch.from_numpy(image)
-        return {'image': image, 'masks': masks}
\ No newline at end of file
+        return {'image': image, 'masks': masks}
+
+class InferencePreprocess(object):
+
+    def __init__(self, output_size=IMG_SIZE):
+        self.output_size = output_size
+        if output_size is not None:
+            self.resize = transforms.Resize(output_size)
+            self.crop = transforms.CenterCrop(output_size)
+        self.clahe = CLAHE(clip_limit=2, p=1)
+
+    def __call__(self, image):
+        if self.output_size is None:
+            image = np.ascontiguousarray(np.uint8(image))
+        else:
+            image = Image.fromarray(np.uint8(image))
+            image = np.asarray(self.crop(self.resize(image)))
+        image = self.clahe(image=image)['image']
+        tensor = torch.from_numpy(image).permute(2, 0, 1).unsqueeze(0)
+        return tensor, image
@@ -0,0 +1,103 @@
+import io
+import numpy as np
+import torch
+import cv2
+from PIL import Image as PILImage
+from nets.Transforms import InferencePreprocess
+from batching import BatchScheduler
+from inference import INPUT_SIZE, device, load_backend, predict, rescale, valid_resolution
+from lesions import analyze_lesions
+from postprocess import OverlayRenderer, class_masks
+from tiling import TiledPredictor, center_resize
+
+def create_scheduler(backend, head, checkpoint_path, script_path=None, onnx_path=None, int8_path=None,
+                     onnx_threads=None, freeze=True, channels_last=False, bf16=False, max_batch_size=4, max_wait_ms=10):
+    model = load_backend(
+        backend,
+        checkpoint_path,
+        script_path=script_path,
+        onnx_path=onnx_path,
+        int8_path=int8_path,
+        onnx_threads=onnx_threads,
+        freeze=freeze,
+        channels_last=channels_last
+    )
+    if head not in model.HEADS:
+        raise ValueError(f'Invalid INFERENCE_HEAD: {head}')
+    return BatchScheduler(lambda batch: predict(model, batch, head, channels_last, bf16), max_batch_size, max_wait_ms)
+
+def decode_image(data):
+    with PILImage.open(io.BytesIO(data)) as img:
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            background = PILImage.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3])
+            return np.asarray(background)
+        return np.asarray(img.convert('RGB'))
+
+def encode_jpeg(image):
+    img_byte_arr = io.BytesIO()
+    PILImage.fromarray(image).save(img_byte_arr, format='JPEG')
+    return img_byte_arr.getvalue()
+
+class InferencePipeline(object):
+
+    input_size = INPUT_SIZE
+
+    def __init__(self, scheduler, tile_size=640, tile_overlap=128, tile_batch_size=4):
+        self.scheduler = scheduler
+        self.preprocess = InferencePreprocess(INPUT_SIZE)
+        self.native_preprocess = InferencePreprocess(None)
+        self.overlay_renderer = OverlayRenderer()
+        self.tiled_predictor = TiledPredictor(
+            lambda tiles: torch.softmax(scheduler.predict(tiles.to(device)), dim=1),
+            tile_size,
+            tile_overlap,
+            tile_batch_size
+        )
+
+    def valid_resolution(self, resolution):
+        return valid_resolution(resolution)
+
+    def warm_up(self):
+        self.scheduler.predict(torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE, dtype=torch.uint8, device=device))
+
+    def load_image(self, data, tiled=False):
+        image_array = decode_image(data)
+        if tiled:
+            return self.native_preprocess(image_array)
+        return self.preprocess(image_array)
+
+    def analyze(self, data, tiled=False, resolution=None):
+        resolution = resolution or INPUT_SIZE
+        image_tensor, original_img = self.load_image(data, tiled=tiled)
+        if tiled:
+            pred_mask = self.tiled_predictor(image_tensor)
+            lesion_counts, lesions = analyze_lesions(pred_mask)
+            original_img = center_resize(original_img, 640)
+            display_mask = center_resize(pred_mask, 640, cv2.INTER_NEAREST)
+        else:
+            prediction = self.scheduler.predict(rescale(image_tensor.to(device), resolution))
+            if resolution != INPUT_SIZE:
+                prediction = rescale(torch.softmax(prediction, dim=1), INPUT_SIZE)
+            pred_mask = display_mask = class_masks(prediction)[0]
+            lesion_counts, lesions = analyze_lesions(pred_mask)
+        if isinstance(original_img, torch.Tensor):
+            original_img = original_img.cpu().numpy()
+        if original_img.shape[0] != 640 or original_img.shape[1] != 640:
+            original_img = cv2.resize(original_img, (640, 640))
+        if len(original_img.shape) == 2:
+            original_img = np.stack([original_img]*3, axis=-1)
+        elif original_img.shape[2] == 1:
+            original_img = np.repeat(original_img, 3, axis=2)
+        if original_img.max() <= 1.0:
+            original_img = (original_img * 255).astype(np.uint8)
+        else:
+            original_img = original_img.astype(np.uint8)
+        overlay = self.overlay_renderer(original_img[None], display_mask[None])[0]
+        return {
+            'lesion_counts': lesion_counts,
+            'lesions': lesions,
+            'preprocessed_image': encode_jpeg(original_img),
+            'predicted_image': encode_jpeg(overlay)
+        }
@@ -0,0 +1,49 @@
+import threading
+import numpy as np
+import torch
+import cv2
+from lesions import LESION_TYPES
+
+LESION_COLORS = {
+    'EX': (255, 0, 96),
+    'MA': (0, 223, 162),
+    'HE': (0, 121, 255),
+    'SE': (246, 250, 112)
+}
+
+def build_palette(colors=LESION_COLORS):
+    palette = np.zeros((256, 3), dtype=np.uint8)
+    for class_idx, lesion_type in LESION_TYPES.items():
+        palette[class_idx] = colors[lesion_type]
+    return palette
+
+def class_masks(outputs):
+    return torch.argmax(outputs, dim=1).to(torch.uint8).cpu().numpy()
+
+class OverlayRenderer(object):
+
+    def __init__(self, palette=None, alpha=0.5):
+        self.palette = build_palette() if palette is None else palette
+        self.alpha = alpha
+        self.local = threading.local()
+
+    def _buffers(self, shape):
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None or buffers[0].shape != shape:
+            buffers = (np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8))
+            self.local.buffers = buffers
+        return buffers
+
+    def __call__(self, images, pred_masks):
+        images = np.ascontiguousarray(images, dtype=np.uint8)
+        colored, blended = self._buffers(images.shape)
+        np.take(self.palette, pred_masks, axis=0, out=colored)
+        rows = images.shape[0] * images.shape[1]
+        blended = cv2.addWeighted(
+            images.reshape(rows, images.shape[-2], 3), self.alpha,
+            colored.reshape(rows, images.shape[-2], 3), 1 - self.alpha, 0,
+            dst=blended.reshape(rows, images.shape[-2], 3)
+        )
+        overlays = images.copy()
+        np.copyto(overlays, blended.reshape(images.shape), where=(pred_masks != 0)[..., None])
+        return overlays
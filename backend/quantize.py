@@ -0,0 +1,113 @@
+import argparse
+import glob
+import json
+import time
+import numpy as np
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.fx.custom_config import PrepareCustomConfig
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from nets.Layers import FrozenSwitchNorm2d
+from nets.Transforms import InferencePreprocess
+from artifacts import read_file, stored_images
+from inference import INPUT_SIZE, QUANTIZED_ENGINE, InferenceHead, load_model, save_torchscript
+from lesions import LESION_TYPES, count_lesions
+from pipeline import decode_image
+
+def load_tensors(paths):
+    preprocess = InferencePreprocess(INPUT_SIZE)
+    for path in paths:
+        yield preprocess(decode_image(read_file(path)))[0].float()
+
+def quantize_int8(model, calibration_paths, head='out_conv3'):
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+    qconfig_mapping = get_default_qconfig_mapping(QUANTIZED_ENGINE).set_object_type(FrozenSwitchNorm2d, None)
+    prepare_custom_config = PrepareCustomConfig().set_non_traceable_module_classes([FrozenSwitchNorm2d])
+    example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    prepared = prepare_fx(
+        InferenceHead(model, head).eval(),
+        qconfig_mapping,
+        example_inputs=(example,),
+        prepare_custom_config=prepare_custom_config
+    )
+    with torch.no_grad():
+        for tensor in load_tensors(calibration_paths):
+            prepared(tensor)
+    return convert_fx(prepared)
+
+def accuracy_report(model, quantized, paths, head='out_conv3'):
+    classes = {0: 'background', **LESION_TYPES}
+    intersections = {name: 0 for name in classes.values()}
+    unions = {name: 0 for name in classes.values()}
+    count_deltas = {name: [] for name in LESION_TYPES.values()}
+    agreement = []
+    fp32_time = []
+    int8_time = []
+    for tensor in load_tensors(paths):
+        with torch.no_grad():
+            start = time.perf_counter()
+            fp32_output = model.infer(tensor, head=head)
+            fp32_time.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            int8_output = quantized(tensor)
+            int8_time.append(time.perf_counter() - start)
+        fp32_mask = torch.argmax(fp32_output, dim=1)[0].to(torch.uint8).numpy()
+        int8_mask = torch.argmax(int8_output, dim=1)[0].to(torch.uint8).numpy()
+        agreement.append(float(np.mean(fp32_mask == int8_mask)))
+        for class_idx, name in classes.items():
+            intersections[name] += int(np.sum((fp32_mask == class_idx) & (int8_mask == class_idx)))
+            unions[name] += int(np.sum((fp32_mask == class_idx) | (int8_mask == class_idx)))
+        fp32_counts = count_lesions(fp32_mask)
+        int8_counts = count_lesions(int8_mask)
+        for name in LESION_TYPES.values():
+            count_deltas[name].append(int8_counts[name] - fp32_counts[name])
+    return {
+        'images': len(agreement),
+        'pixel_agreement': float(np.mean(agreement)) if agreement else None,
+        'class_iou': {name: intersections[name] / unions[name] if unions[name] else 1.0 for name in classes.values()},
+        'lesion_count_delta': {
+            name: {
+                'mean': float(np.mean(deltas)),
+                'mean_abs': float(np.mean(np.abs(deltas))),
+                'max_abs': int(np.max(np.abs(deltas)))
+            } for name, deltas in count_deltas.items() if deltas
+        },
+        'latency_ms': {
+            'fp32': float(np.median(fp32_time) * 1000) if fp32_time else None,
+            'int8': float(np.median(int8_time) * 1000) if int8_time else None
+        }
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--checkpoint', default='model/model-mcaunet.pth.tar')
+    parser.add_argument('--output', default='model/model-mcaunet.int8.ts.pt')
+    parser.add_argument('--report', default='model/model-mcaunet.int8.json')
+    parser.add_argument('--head', default='out_conv3')
+    parser.add_argument('--images')
+    parser.add_argument('--calibration-images', type=int, default=32)
+    parser.add_argument('--eval-images', type=int, default=16)
+    args = parser.parse_args()
+    paths = sorted(glob.glob(args.images)) if args.images else stored_images()
+    calibration_paths = paths[:args.calibration_images]
+    eval_paths = paths[args.calibration_images:args.calibration_images + args.eval_images]
+    held_out = bool(eval_paths)
+    if not held_out:
+        eval_paths = calibration_paths[:args.eval_images]
+    if not calibration_paths:
+        raise SystemExit(f"No calibration images match {args.images or 'original-image/*'}")
+    model = load_model(args.checkpoint)
+    model.cpu()
+    quantized = quantize_int8(model, calibration_paths, args.head)
+    scripted = save_torchscript(quantized, args.output, args.head, optimize=False, example_device='cpu')
+    report = accuracy_report(model, scripted, eval_paths, args.head)
+    report.update({
+        'head': args.head,
+        'engine': QUANTIZED_ENGINE,
+        'calibration_images': len(calibration_paths),
+        'held_out': held_out
+    })
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'wrote {args.output} ({len(calibration_paths)} calibration images)')
+    print(json.dumps(report, indent=2))
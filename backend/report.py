@@ -0,0 +1,253 @@
+import io
+import os
+from copy import copy
+from PIL import Image as PILImage
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.graphics.shapes import Drawing, Rect
+from lesions import get_severity_text
+from artifacts import wait_for_files
+from history_store import HistoryStore
+from report_jobs import REPORT_BASE_URL
+
+REPORT_FONT = 'wqy-zenhei'
+REPORT_FONT_PATH = '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc'
+REPORT_IMAGE_SIZE = 3
+
+LESION_COLORS = {
+    'MA': (0, 223, 162),
+    'HE': (0, 121, 255),
+    'EX': (255, 0, 96),
+    'SE': (246, 250, 112)
+}
+
+LESION_DESCRIPTIONS = [
+    ('微动脉瘤（Microaneurysm，MA）', '视网膜毛细血管壁局部膨出形成的微小瘤状结构，是糖尿病视网膜病变最早的病理特征。'),
+    ('出血点（Hemorrhage，HE）', '视网膜深层毛细血管破裂导致的点状或片状出血，位于内核层或外丛状层。'),
+    ('硬性渗出（Hard Exudates，EX）', '脂质和蛋白质渗漏沉积于外丛状层，呈蜡黄色点片状，边界清晰，提示慢性视网膜水肿。'),
+    ('软性渗出（Soft Exudates，SE）', '神经纤维层微梗死导致的轴浆蓄积，呈白色絮状、边界模糊，阻碍下方血管观察。')
+]
+
+SEVERITY_SCALE = '根据国际临床 DR 严重程度量表，DR 共分为 5 级：健康、轻度非增殖性 DR（Mild non-proliferative DR，Mild-NPDR）、中度非增殖性 DR（Moderate non-proliferative DR，Moderate-NPDR）、重度非增殖性 DR（Severe non-proliferative DR，Severe-NPDR）和增殖性 DR（Proliferative DR，PDR）。'
+
+def register_font():
+    if REPORT_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(REPORT_FONT, REPORT_FONT_PATH))
+
+class ReportRenderer(object):
+
+    def __init__(self, image_dpi=150):
+        register_font()
+        self.image_dpi = image_dpi
+        self.styles = self._build_styles()
+        self.patient_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), REPORT_FONT),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey)
+        ])
+        self.image_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), REPORT_FONT),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEADING', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 5),
+            ('TOPPADDING', (0, 0), (-1, 0), 5),
+            ('BOTTOMPADDING', (1, 0), (1, 0), 0)
+        ])
+        self.lesion_table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), REPORT_FONT),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey)
+        ])
+        self.image_headers = [
+            Paragraph('眼底原始图像', self.styles['Center']),
+            Paragraph('眼底检测图像', self.styles['Center'])
+        ]
+        self.header = [
+            Paragraph('糖尿病性视网膜病变诊断分析报告', self.styles['Title']),
+            Paragraph('本报告由糖尿病性视网膜病变诊断智能平台 DiabRetina AI 生成', self.styles['Subtitle']),
+            Spacer(1, 16)
+        ]
+        self.sections = {title: Paragraph(title, self.styles['Section']) for title in [
+            '患者基本信息',
+            '眼底图像',
+            '病灶类型说明',
+            '患者病史信息',
+            '病灶严重程度分级',
+            '临床诊断意见',
+            '治疗方案',
+            'AI 辅助诊断意见'
+        ]}
+        self.labels = {label: Paragraph(label, self.styles['Left']) for label in ['主诉：', '现病史：', '既往史：']}
+        self.lesion_explanation_table = self._build_lesion_explanation_table()
+        self.severity_scale = Paragraph(SEVERITY_SCALE, self.styles['Comment'])
+
+    def _build_styles(self):
+        styles = getSampleStyleSheet()
+        styles.add(ParagraphStyle(name='Center', fontName=REPORT_FONT, alignment=TA_CENTER))
+        styles.add(ParagraphStyle(name='Left', fontName=REPORT_FONT, alignment=TA_LEFT))
+        styles.add(ParagraphStyle(name='Comment', fontName=REPORT_FONT, fontSize=9, alignment=TA_LEFT))
+        styles['Title'].fontSize = 18
+        styles['Title'].alignment = TA_CENTER
+        styles['Title'].spaceAfter = 20
+        styles['Title'].fontName = REPORT_FONT
+        styles.add(ParagraphStyle(name='Subtitle', fontName=REPORT_FONT, fontSize=10, alignment=TA_CENTER, spaceAfter=10))
+        styles.add(ParagraphStyle(name='Section', fontName=REPORT_FONT, fontSize=12, alignment=TA_LEFT, spaceBefore=10, spaceAfter=5))
+        styles.add(ParagraphStyle(name='Footer', fontName=REPORT_FONT, fontSize=9, textColor=colors.grey))
+        return styles
+
+    def _build_lesion_explanation_table(self):
+        lesion_explanation_data = []
+        for title, desc in LESION_DESCRIPTIONS:
+            lesion_type = title.split('（')[-1].split('）')[0].split('，')[-1]
+            color = LESION_COLORS[lesion_type]
+            d = Drawing(18, 18)
+            d.add(Rect(
+                0, 0, 20, 20,
+                fillColor=colors.Color(color[0]/255, color[1]/255, color[2]/255),
+                strokeColor=colors.lightgrey,
+                strokeWidth=1
+            ))
+            lesion_explanation_data.append([d, Paragraph(f'{title}\n{desc}', self.styles['Comment'])])
+        lesion_explanation_table = Table(lesion_explanation_data, colWidths=[0.5*inch, 5.5*inch])
+        lesion_explanation_table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), REPORT_FONT),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (0, 0), (0, -1), 'CENTER'),
+            ('LEFTPADDING', (0, 0), (-1, -1), 0),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+            ('GRID', (0, 0), (-1, -1), 0, colors.white),
+            ('BOX', (0, 0), (-1, -1), 0, colors.white)
+        ]))
+        return lesion_explanation_table
+
+    def _image(self, image_path):
+        size = REPORT_IMAGE_SIZE * inch
+        if self.image_dpi:
+            pixels = int(round(REPORT_IMAGE_SIZE * self.image_dpi))
+            with PILImage.open(image_path) as img:
+                if max(img.size) > pixels:
+                    img = img.convert('RGB')
+                    img.thumbnail((pixels, pixels), PILImage.LANCZOS)
+                    img_byte_arr = io.BytesIO()
+                    img.save(img_byte_arr, format='JPEG', quality=90)
+                    img_byte_arr.seek(0)
+                    return Image(img_byte_arr, width=size, height=size)
+        return Image(image_path, width=size, height=size)
+
+    def _section(self, title):
+        return [copy(self.sections[title]), Spacer(1, 12)]
+
+    def _history(self, label, text):
+        return [copy(self.labels[label]), Spacer(1, 4), Paragraph(text, self.styles['Left'])]
+
+    def render(self, pdf_path, data, generate_time):
+        story = [copy(flowable) for flowable in self.header]
+        story.append(Paragraph(f"报告编号：{data['uuid']}", self.styles['Subtitle']))
+        story.append(Paragraph(f"生成时间：{generate_time}", self.styles['Subtitle']))
+        story.append(Spacer(1, 40))
+        story.extend(self._section('患者基本信息'))
+        patient_data = [
+            ['姓名', data['name']],
+            ['性别', data['gender']],
+            ['年龄', data['age']],
+            ['职业', data['occupation']],
+            ['联系方式', data['contact']],
+            ['家庭住址', data['address']]
+        ]
+        patient_table = Table(patient_data, colWidths=[1.5*inch, 4*inch])
+        patient_table.setStyle(self.patient_table_style)
+        story.append(patient_table)
+        story.append(Spacer(1, 24))
+        story.extend(self._section('眼底图像'))
+        original_img_path = os.path.join('preprocessed-image', f"{data['uuid']}.jpg")
+        predicted_img_path = os.path.join('predicted-image', f"{data['uuid']}.jpg")
+        img_table_data = [
+            [copy(header) for header in self.image_headers],
+            [self._image(original_img_path), self._image(predicted_img_path)]
+        ]
+        img_table = Table(img_table_data, colWidths=[3.5*inch, 3.5*inch])
+        img_table.setStyle(self.image_table_style)
+        story.append(img_table)
+        story.append(Spacer(1, 24))
+        story.extend(self._section('病灶类型说明'))
+        story.append(copy(self.lesion_explanation_table))
+        story.append(Spacer(1, 24))
+        story.extend(self._section('患者病史信息'))
+        story.extend(self._history('主诉：', data['chief_complaint']))
+        story.append(Spacer(1, 8))
+        story.extend(self._history('现病史：', data['present_illness']))
+        story.append(Spacer(1, 8))
+        story.extend(self._history('既往史：', data['past_history']))
+        story.append(Spacer(1, 24))
+        story.extend(self._section('病灶严重程度分级'))
+        lesion_data = [
+            ['病灶类型', '数量', '严重程度分级'],
+            ['微动脉瘤（MA）', data['ma_count'], get_severity_text(data['ma_severity'])],
+            ['出血点（HE）', data['he_count'], get_severity_text(data['he_severity'])],
+            ['硬性渗出（EX）', data['ex_count'], get_severity_text(data['ex_severity'])],
+            ['软性渗出（SE）', data['se_count'], get_severity_text(data['se_severity'])]
+        ]
+        lesion_table = Table(lesion_data, colWidths=[1.5*inch, 1*inch, 3*inch])
+        lesion_table.setStyle(self.lesion_table_style)
+        story.append(lesion_table)
+        story.append(Spacer(1, 8))
+        story.append(copy(self.severity_scale))
+        story.append(Spacer(1, 24))
+        story.extend(self._section('临床诊断意见'))
+        story.append(Paragraph(data['clinical_diagnosis'], self.styles['Left']))
+        story.append(Spacer(1, 24))
+        story.extend(self._section('治疗方案'))
+        story.append(Paragraph(data['treatment_plan'], self.styles['Left']))
+        story.append(Spacer(1, 24))
+        story.extend(self._section('AI 辅助诊断意见'))
+        for para in data['ai_diagnosis'].split('\n'):
+            if para.strip():
+                story.append(Paragraph(para.strip(), self.styles['Left']))
+                story.append(Spacer(1, 5))
+        story.append(Spacer(1, 48))
+        pdf_link = f"{REPORT_BASE_URL}/diagnostic-report/{data['uuid']}"
+        story.append(Paragraph(f'报告下载链接：{pdf_link}', self.styles['Footer']))
+        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
+        doc.build(story)
+        return pdf_link
+
+report_renderers = {}
+history_stores = {}
+
+def render_report_job(data, generate_time, image_dpi, history_db_path, artifact_timeout=30, current=None):
+    wait_for_files([
+        os.path.join('preprocessed-image', f"{data['uuid']}.jpg"),
+        os.path.join('predicted-image', f"{data['uuid']}.jpg")
+    ], artifact_timeout)
+    renderer = report_renderers.get(image_dpi)
+    if renderer is None:
+        renderer = report_renderers[image_dpi] = ReportRenderer(image_dpi=image_dpi)
+    pdf_path = os.path.join('diagnostic-report', f"{data['uuid']}.pdf")
+    tmp_path = os.path.join('diagnostic-report', f".{data['uuid']}.{os.getpid()}.pdf")
+    try:
+        renderer.render(tmp_path, data, generate_time)
+        if current is not None and not current():
+            return None
+        os.replace(tmp_path, pdf_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    history_store = history_stores.get(history_db_path)
+    if history_store is None:
+        history_store = history_stores[history_db_path] = HistoryStore(history_db_path)
+    history_store.add(dict(data, time=generate_time))
+    return pdf_path
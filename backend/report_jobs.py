@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+REPORT_BASE_URL = 'http://110.42.214.164:8005'
+
+def read_marker(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_marker(path, content):
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f'.{name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def remove_marker(path, token=None):
+    if token is not None and read_marker(path) != token:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def run_report_job(output_dir, data, generate_time, image_dpi, history_db_path, artifact_timeout, token):
+    from report import render_report_job
+    pending_path = os.path.join(output_dir, f"{data['uuid']}.pending")
+    current = lambda: read_marker(pending_path) == token
+    if not current():
+        return None
+    write_marker(os.path.join(output_dir, f"{data['uuid']}.running"), token)
+    return render_report_job(data, generate_time, image_dpi, history_db_path, artifact_timeout, current)
+
+class ReportJobQueue(object):
+
+    def __init__(self, output_dir, history_db_path, max_workers=2, image_dpi=150, timeout=300, artifact_timeout=30,
+                 queue_timeout=3600):
+        self.output_dir = output_dir
+        self.history_db_path = history_db_path
+        self.max_workers = max_workers
+        self.image_dpi = image_dpi
+        self.timeout = timeout
+        self.artifact_timeout = artifact_timeout
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def _executor(self, broken=None):
+        with self.lock:
+            if broken is not None and self.executor is broken:
+                broken.shutdown(wait=False)
+                self.executor = None
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self.pid = os.getpid()
+            return self.executor
+
+    def _marker(self, report_uuid, state):
+        return os.path.join(self.output_dir, f'{report_uuid}.{state}')
+
+    def submit(self, data, generate_time):
+        report_uuid = data['uuid']
+        token = uuid.uuid4().hex
+        write_marker(self._marker(report_uuid, 'pending'), token)
+        remove_marker(self._marker(report_uuid, 'failed'))
+        job = (
+            run_report_job,
+            self.output_dir,
+            data,
+            generate_time,
+            self.image_dpi,
+            self.history_db_path,
+            self.artifact_timeout,
+            token
+        )
+        executor = self._executor()
+        try:
+            future = executor.submit(*job)
+        except BrokenProcessPool:
+            future = self._executor(broken=executor).submit(*job)
+        future.add_done_callback(lambda f: self._finished(report_uuid, token, f))
+        return report_uuid
+
+    def _finished(self, report_uuid, token, future):
+        # A newer submission for the same uuid owns the markers once it has rewritten .pending.
+        remove_marker(self._marker(report_uuid, 'running'), token)
+        if read_marker(self._marker(report_uuid, 'pending')) != token:
+            return
+        error = future.exception()
+        if error is not None:
+            write_marker(self._marker(report_uuid, 'failed'), str(error) or type(error).__name__)
+        remove_marker(self._marker(report_uuid, 'pending'), token)
+
+    def status(self, report_uuid):
+        error = read_marker(self._marker(report_uuid, 'failed'))
+        if error is not None:
+            return 'failed', error
+        token = read_marker(self._marker(report_uuid, 'pending'))
+        started = None
+        if token is not None:
+            try:
+                if read_marker(self._marker(report_uuid, 'running')) == token:
+                    started = os.path.getmtime(self._marker(report_uuid, 'running'))
+                    timeout = self.timeout
+                else:
+                    started = os.path.getmtime(self._marker(report_uuid, 'pending'))
+                    timeout = self.queue_timeout
+            except OSError:
+                pass
+        if started is not None:
+            if time.time() - started > timeout:
+                return 'failed', 'Report generation timed out'
+            return 'pending', None
+        if os.path.exists(os.path.join(self.output_dir, f'{report_uuid}.pdf')):
+            return 'done', None
+        return None, None
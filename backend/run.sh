@@ -1,3 +1,8 @@
 #!/bin/bash
 
-gunicorn -w 4 -b 0.0.0.0:8005 main:app
\ No newline at end of file
+if [ -n "$INFERENCE_SERVER" ]; then
+    python inference_server.py &
+    trap "kill $!" EXIT
+fi
+
+gunicorn -w 4 --threads 4 --preload -b 0.0.0.0:8005 main:app
\ No newline at end of file
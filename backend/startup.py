@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+
+class NotReadyError(RuntimeError):
+    pass
+
+class StartupTimer(object):
+
+    def __init__(self, name, started=None):
+        self.name = name
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        print(f'[{os.getpid()}] {self.name} startup: {phase} {(now - self.last) * 1000:.0f} ms '
+              f'(total {(now - self.started) * 1000:.0f} ms)', flush=True)
+        self.last = now
+
+    def breakdown(self):
+        return {phase: round(duration * 1000, 1) for phase, duration in self.phases}
+
+class BackgroundLoader(object):
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.value = None
+        self.error = None
+
+    def start(self):
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.event = threading.Event()
+            self.value = None
+            self.error = None
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name=f'{self.name}-loader', daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        try:
+            self.value = self.load()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.event.set()
+
+    def status(self):
+        if self.thread is None or self.pid != os.getpid():
+            return 'stopped'
+        if not self.event.is_set():
+            return 'loading'
+        return 'failed' if self.error is not None else 'ready'
+
+    def get(self, timeout=None):
+        self.start()
+        if not self.event.wait(timeout):
+            raise NotReadyError(f'{self.name} is still loading')
+        if self.error is not None:
+            raise NotReadyError(f'{self.name} failed to load: {self.error}')
+        return self.value
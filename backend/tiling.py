@@ -0,0 +1,79 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+import cv2
+
+def tile_starts(length, tile_size, overlap):
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+def blend_window(tile_size, overlap):
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        edge = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+        ramp[:overlap] = edge
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], edge[::-1])
+    return torch.from_numpy(np.outer(ramp, ramp))
+
+def center_resize(image, output_size, interpolation=cv2.INTER_LINEAR):
+    h, w = image.shape[:2]
+    scale = output_size / min(h, w)
+    new_w, new_h = max(output_size, int(round(w * scale))), max(output_size, int(round(h * scale)))
+    image = cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+    top, left = (new_h - output_size) // 2, (new_w - output_size) // 2
+    return image[top:top + output_size, left:left + output_size]
+
+class TiledPredictor(object):
+
+    def __init__(self, predict_batch, tile_size=640, overlap=128, batch_size=4):
+        if not 0 <= overlap < tile_size:
+            raise ValueError('Tile overlap must be smaller than the tile size')
+        self.predict_batch = predict_batch
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = max(1, int(batch_size))
+        self.window = blend_window(tile_size, overlap)
+
+    def _predict_tiles(self, image_tensor, y, xs):
+        tile = self.tile_size
+        tiles = []
+        for x in xs:
+            crop = image_tensor[:, :, y:y + tile, x:x + tile]
+            pad_h, pad_w = tile - crop.shape[2], tile - crop.shape[3]
+            if pad_h or pad_w:
+                crop = F.pad(crop, (0, pad_w, 0, pad_h))
+            tiles.append(crop)
+        return self.predict_batch(torch.cat(tiles, dim=0)).float().cpu()
+
+    def __call__(self, image_tensor):
+        _, _, height, width = image_tensor.shape
+        tile = self.tile_size
+        ys = tile_starts(height, tile, self.overlap)
+        xs = tile_starts(width, tile, self.overlap)
+        pred_mask = np.empty((height, width), dtype=np.uint8)
+        accumulator = None
+        band_top = 0
+        for y in ys:
+            shift = y - band_top
+            if shift:
+                self._finalize(pred_mask, accumulator, band_top, shift)
+                accumulator[:, :tile - shift] = accumulator[:, shift:].clone()
+                accumulator[:, tile - shift:] = 0
+                band_top = y
+            for i in range(0, len(xs), self.batch_size):
+                batch_xs = xs[i:i + self.batch_size]
+                probabilities = self._predict_tiles(image_tensor, y, batch_xs)
+                if accumulator is None:
+                    accumulator = torch.zeros(probabilities.shape[1], tile, max(width, tile))
+                for probability, x in zip(probabilities, batch_xs):
+                    accumulator[:, :, x:x + tile] += probability * self.window
+        self._finalize(pred_mask, accumulator, band_top, height - band_top)
+        return pred_mask
+
+    def _finalize(self, pred_mask, accumulator, band_top, rows):
+        band = accumulator[:, :rows, :pred_mask.shape[1]]
+        pred_mask[band_top:band_top + rows] = torch.argmax(band, dim=0).numpy().astype(np.uint8)
@@ -17,6 +17,16 @@ const LESION_COLORS = {
   "SE": "#F6FA70"
 };
 
+const waitForReport = async (reportPath) => {
+  for (;;) {
+    const response = await fetch(reportPath, {method: "HEAD"});
+    if (response.status !== 202) {
+      return;
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+};
+
 function Diagnosis() {
   const [fileUuid, setFileUuid] = useState(null);
   const [preprocessedImage, setPreprocessedImage] = useState(null);
@@ -176,6 +186,7 @@ function Diagnosis() {
         console.error("Network response was not ok");
       }
       const data = await response.json();
+      await waitForReport(data.report_path);
       setReportGenerated(true);
       window.open(data.report_path, "_blank");
       window.location.href = "/";
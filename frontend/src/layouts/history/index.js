@@ -7,78 +7,97 @@ import DashboardLayout from "components/DashboardLayout";
 import DashboardNavbar from "components/DashboardNavbar";
 import DataTable from "components/DataTable";
 import MDAvatar from "components/MDAvatar";
+import MDButton from "components/MDButton";
 import avatar from "assets/images/icon.png";
 
+const HISTORY_PAGE_SIZE = 20;
+
 function History() {
   const [rows, setRows] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  useEffect(() => {
-    const fetchHistory = async () => {
-      try {
-        const response = await fetch("http://110.42.214.164:8005/history");
-        const data = await response.json();
-        if (data.history) {
-          const formattedRows = data.history.map((record) => ({
-            patient: (
-              <MDBox display="flex" alignItems="center" lineHeight={1}>
-                <MDAvatar src={avatar} name={record.name} size="sm"/>
-                <MDBox ml={2} lineHeight={1}>
-                  <MDTypography display="block" variant="button" fontWeight="medium">
-                    {record.name}
-                  </MDTypography>
-                  <MDTypography variant="caption">{record.gender}</MDTypography>
-                </MDBox>
-              </MDBox>
-            ),
-            age: (
-              <MDTypography variant="caption" fontWeight="medium">
-                {record.age}
-              </MDTypography>
-            ),
-            occupation: (
-              <MDTypography variant="caption" fontWeight="medium">
-                {record.occupation}
-              </MDTypography>
-            ),
-            contact: (
-              <MDBox lineHeight={1}>
-                <MDTypography display="block" variant="caption" fontWeight="medium">
-                  {record.contact}
+  const fetchHistory = async (cursor) => {
+    const params = new URLSearchParams({limit: HISTORY_PAGE_SIZE});
+    if (cursor) {
+      params.set("cursor", cursor);
+    }
+    try {
+      const response = await fetch(`http://110.42.214.164:8005/history?${params}`);
+      const data = await response.json();
+      if (data.history) {
+        const formattedRows = data.history.map((record) => ({
+          patient: (
+            <MDBox display="flex" alignItems="center" lineHeight={1}>
+              <MDAvatar src={avatar} name={record.name} size="sm"/>
+              <MDBox ml={2} lineHeight={1}>
+                <MDTypography display="block" variant="button" fontWeight="medium">
+                  {record.name}
                 </MDTypography>
-                <MDTypography variant="caption">{record.address}</MDTypography>
+                <MDTypography variant="caption">{record.gender}</MDTypography>
               </MDBox>
-            ),
-            time: (
-              <MDTypography variant="caption" fontWeight="medium">
-                {record.time}
-              </MDTypography>
-            ),
-            report: (
-              <MDTypography
-                component="a"
-                href={`http://110.42.214.164:8005/diagnostic-report/${record.uuid}`}
-                target="_blank"
-                rel="noopener noreferrer"
-                variant="caption"
-                color="text"
-                fontWeight="medium"
-              >
-                查看报告
+            </MDBox>
+          ),
+          age: (
+            <MDTypography variant="caption" fontWeight="medium">
+              {record.age}
+            </MDTypography>
+          ),
+          occupation: (
+            <MDTypography variant="caption" fontWeight="medium">
+              {record.occupation}
+            </MDTypography>
+          ),
+          contact: (
+            <MDBox lineHeight={1}>
+              <MDTypography display="block" variant="caption" fontWeight="medium">
+                {record.contact}
               </MDTypography>
-            )
-          }));
-          setRows(formattedRows);
-        }
-      } catch (error) {
-        console.error("Error fetching history:", error);
-      } finally {
-        setLoading(false);
+              <MDTypography variant="caption">{record.address}</MDTypography>
+            </MDBox>
+          ),
+          time: (
+            <MDTypography variant="caption" fontWeight="medium">
+              {record.time}
+            </MDTypography>
+          ),
+          report: (
+            <MDTypography
+              component="a"
+              href={`http://110.42.214.164:8005/diagnostic-report/${record.uuid}`}
+              target="_blank"
+              rel="noopener noreferrer"
+              variant="caption"
+              color="text"
+              fontWeight="medium"
+            >
+              查看报告
+            </MDTypography>
+          )
+        }));
+        setRows((previousRows) => (cursor ? previousRows.concat(formattedRows) : formattedRows));
+        setNextCursor(data.next_cursor);
       }
-    };
-    fetchHistory();
+    } catch (error) {
+      console.error("Error fetching history:", error);
+    } finally {
+      setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  useEffect(() => {
+    fetchHistory(null);
   }, []);
 
+  const loadMore = () => {
+    if (nextCursor && !loadingMore) {
+      setLoadingMore(true);
+      fetchHistory(nextCursor);
+    }
+  };
+
   const columns = [
     {Header: "患者姓名 / 性别", accessor: "patient", width: "15%", align: "left"},
     {Header: "年龄", accessor: "age", width: "10%", align: "center"},
@@ -123,6 +142,13 @@ function History() {
                     noEndBorder
                   />
                 )}
+                {!loading && nextCursor && (
+                  <MDBox p={3} textAlign="center">
+                    <MDButton variant="gradient" color="info" onClick={loadMore} disabled={loadingMore}>
+                      {loadingMore ? "加载中..." : "加载更多"}
+                    </MDButton>
+                  </MDBox>
+                )}
               </MDBox>
             </Card>
           </Grid>